@@ -0,0 +1,481 @@
+# Asset baking
+# Scales every entry of IMAGE_SIZES to its final size once and stores the raw
+# pixels in cache/, so startup reads bytes instead of decoding multi-megabyte
+# PNGs. An entry is rebuilt only when its source file or target size changes.
+#
+# Baking also classifies every image by how it uses alpha so that the loader
+# can store it in the matching display-native format:
+#   opaque   - every pixel fully opaque, converted with convert()
+#   colorkey - alpha is only ever 0 or 255, converted with convert() plus an
+#              RLE colorkey (transparent pixels are rewritten to the key)
+#   alpha    - real translucency, converted with convert_alpha()
+# The class is stored in the manifest next to the entry's size, so it is only
+# computed when the entry is rebaked.
+#
+# The world map is baked too: the background and every static prop from
+# OBJECT_POSITIONS are composited and split into fixed-size chunks under
+# cache/world/, which world_layer.py streams in around the camera. This is an
+# offline step. The game never composites the world itself: when the world
+# bake is missing or out of date, start_world_bake() reruns this script with
+# --world in a separate process while the game starts up, decoding the world's
+# sources in parallel, and open_world_index() waits for it once the world is
+# needed. Baking decodes the whole background at once, so that process
+# briefly needs memory for the full map, but the game's own memory only grows
+# with the chunks around the camera.
+#
+# Every other sprite no larger than ATLAS_MAX_SIDE is shelf-packed into a few
+# atlas sheets under cache/atlas/, with an index of where each sprite sits, so
+# the game opens a couple of sheet files instead of one file per sprite and
+# draws those sprites as subsurfaces of a shared surface. Only sprites with
+# real translucency are packed: RLE colorkey acceleration does not carry over
+# to subsurfaces, and an opaque or colorkeyed sprite blits several times
+# faster on its own surface than from a sheet.
+#
+# Usage: python bake_assets.py [--force] [--measure] [--world]
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+from image_sizes import IMAGE_SIZES
+from object_positions import OBJECT_POSITIONS
+from presenter import display_ready, to_display
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMG_DIR = os.path.join(BASE_DIR, 'img')
+CACHE_DIR = os.path.join(BASE_DIR, 'cache')
+MANIFEST_PATH = os.path.join(CACHE_DIR, 'manifest.json')
+WORLD_DIR = os.path.join(CACHE_DIR, 'world')
+WORLD_INDEX_PATH = os.path.join(WORLD_DIR, 'index.json')
+BACKGROUND_KEY = 'background/background.png'
+CHUNK_SIZE = 512
+CHUNK_FORMAT = 'RGB'
+ATLAS_DIR = os.path.join(CACHE_DIR, 'atlas')
+ATLAS_INDEX_PATH = os.path.join(ATLAS_DIR, 'index.json')
+ATLAS_SHEET_SIZE = 512
+ATLAS_MAX_SIDE = 160
+ATLAS_PADDING = 1
+
+# Bump when the on-disk layout of cached entries changes
+CACHE_VERSION = 2
+PIXEL_FORMAT = 'RGBA'
+
+OPAQUE = 'opaque'
+COLORKEY = 'colorkey'
+ALPHA = 'alpha'
+
+# Tried in order until one is not used by any opaque pixel of the image
+COLORKEY_CANDIDATES = [(255, 0, 255), (0, 255, 255), (1, 254, 1), (254, 1, 254)]
+
+
+def source_path(key):
+    return os.path.join(IMG_DIR, *key.split('/'))
+
+
+def cache_path(key):
+    name = key.replace('/', '__').replace(' ', '_')
+    return os.path.join(CACHE_DIR, name + '.' + PIXEL_FORMAT.lower())
+
+
+def source_stamp(key, size):
+    st = os.stat(source_path(key))
+    return {'mtime_ns': st.st_mtime_ns, 'bytes': st.st_size, 'size': list(size)}
+
+
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {'version': CACHE_VERSION, 'entries': {}}
+    if manifest.get('version') != CACHE_VERSION:
+        return {'version': CACHE_VERSION, 'entries': {}}
+    return manifest
+
+
+def save_manifest(manifest):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = MANIFEST_PATH + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, MANIFEST_PATH)
+
+
+def is_stale(manifest, key, size):
+    entry = manifest['entries'].get(key)
+    if entry is None or entry['stamp'] != source_stamp(key, size):
+        return True
+    return not os.path.exists(cache_path(key))
+
+
+def classify(data):
+    # Returns (kind, colorkey) for raw RGBA pixels; may rewrite data in place
+    alpha = data[3::4]
+    opaque = alpha.count(255)
+    if opaque == len(alpha):
+        return OPAQUE, None
+    if opaque + alpha.count(0) != len(alpha):
+        return ALPHA, None
+
+    used = {bytes(data[i:i + 3]) for i in range(0, len(data), 4) if data[i + 3]}
+    for key in COLORKEY_CANDIDATES:
+        if bytes(key) not in used:
+            break
+    else:
+        return ALPHA, None
+    for i in range(0, len(data), 4):
+        if not data[i + 3]:
+            data[i:i + 4] = bytes(key) + b'\xff'
+    return COLORKEY, list(key)
+
+
+def bake_image(key, size):
+    # Decode, scale and classify the source, write the raw pixels and return
+    # them together with the classification
+    surface = pygame.transform.scale(pygame.image.load(source_path(key)), size)
+    data = bytearray(pygame.image.tobytes(surface, PIXEL_FORMAT))
+    kind, colorkey = classify(data)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = cache_path(key) + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, cache_path(key))
+    return data, {'kind': kind, 'colorkey': colorkey}
+
+
+def read_baked(key):
+    with open(cache_path(key), 'rb') as f:
+        return f.read()
+
+
+def surface_from_bytes(data, size, entry=None):
+    # Wraps baked pixels, converting them to the display format once the
+    # screen exists (see presenter.py)
+    surface = pygame.image.frombuffer(data, size, PIXEL_FORMAT)
+    if entry is None:
+        return surface
+    if not display_ready():
+        if entry['kind'] == COLORKEY:
+            surface.set_colorkey(entry['colorkey'])
+        return surface
+    if entry['kind'] == OPAQUE:
+        return to_display(surface)
+    if entry['kind'] == COLORKEY:
+        surface = to_display(surface)
+        surface.set_colorkey(entry['colorkey'], pygame.RLEACCEL)
+        return surface
+    return to_display(surface, alpha=True)
+
+
+def ensure_baked(manifest, key, size):
+    # Returns (pixels, entry, rebuilt); the caller saves the manifest when
+    # rebuilt
+    if is_stale(manifest, key, size):
+        data, entry = bake_image(key, size)
+        entry['stamp'] = source_stamp(key, size)
+        manifest['entries'][key] = entry
+        return data, entry, True
+    return read_baked(key), manifest['entries'][key], False
+
+
+def load_images(sizes=IMAGE_SIZES):
+    # Returns {key: Surface}, baking any entry that is missing or out of date
+    manifest = load_manifest()
+    images = {}
+    rebuilt = False
+    for key, size in sizes.items():
+        data, entry, changed = ensure_baked(manifest, key, size)
+        rebuilt = rebuilt or changed
+        images[key] = surface_from_bytes(data, size, entry)
+    if rebuilt:
+        save_manifest(manifest)
+    return images
+
+
+def bake_all(sizes=IMAGE_SIZES, force=False):
+    manifest = load_manifest()
+    if force:
+        manifest['entries'] = {}
+    rebuilt = []
+    for key, size in sizes.items():
+        if ensure_baked(manifest, key, size)[2]:
+            rebuilt.append(key)
+    save_manifest(manifest)
+    return rebuilt
+
+
+def static_props(positions=OBJECT_POSITIONS):
+    # Objects that are never interacted with and never move
+    return {name: (key, pos) for name, (key, pos, interactable, _) in positions.items() if not interactable}
+
+
+def world_sources(positions=OBJECT_POSITIONS):
+    return sorted({BACKGROUND_KEY} | {key for key, _ in static_props(positions).values()})
+
+
+def chunk_path(cx, cy):
+    return os.path.join(WORLD_DIR, f'chunk_{cx}_{cy}.{CHUNK_FORMAT.lower()}')
+
+
+def world_stamp(sizes, positions, chunk_size):
+    props = static_props(positions)
+    return {
+        'chunk_size': chunk_size,
+        'sources': {key: source_stamp(key, sizes[key]) for key in world_sources(positions)},
+        'props': {name: [key, list(pos)] for name, (key, pos) in sorted(props.items())},
+    }
+
+
+def decode_sources(sizes, keys, workers=None):
+    # {key: scaled Surface} straight from the source files, decoded on a
+    # thread pool (pygame releases the GIL while decoding and scaling) and
+    # without touching the bake cache or its manifest
+    def decode(key):
+        return pygame.transform.scale(pygame.image.load(source_path(key)), sizes[key])
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        return dict(zip(keys, pool.map(decode, keys)))
+
+
+def read_world_index(sizes=IMAGE_SIZES, positions=OBJECT_POSITIONS, chunk_size=CHUNK_SIZE):
+    # The baked world's index, or None when it is missing or out of date
+    try:
+        with open(WORLD_INDEX_PATH) as f:
+            index = json.load(f)
+        if index.get('version') == CACHE_VERSION and index['stamp'] == world_stamp(sizes, positions, chunk_size):
+            return index
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+def start_world_bake():
+    # Starts rebaking a missing or stale world in a child process, so the
+    # game never holds the whole background; returns the process, or None
+    # when the bake is up to date. Its report goes to stderr, leaving the
+    # game's stdout alone
+    if read_world_index() is not None:
+        return None
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), '--world'], stdout=sys.stderr)
+
+
+def open_world_index(bake=None):
+    # The world index for the game, after waiting for a bake started by
+    # start_world_bake(); bakes in a child process now if it is still stale
+    if bake is not None and bake.wait() != 0:
+        raise RuntimeError(f"world bake failed with status {bake.returncode}")
+    index = read_world_index()
+    if index is None:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--world'], check=True, stdout=sys.stderr)
+        index = read_world_index()
+        if index is None:
+            raise RuntimeError("world bake did not produce an up-to-date index")
+    return index
+
+
+def bake_world(sizes=IMAGE_SIZES, positions=OBJECT_POSITIONS, chunk_size=CHUNK_SIZE, force=False, load=None):
+    # Composites the background and static props into chunks and returns the
+    # world index; does nothing but read the index when it is up to date.
+    # load(key) fetches a scaled source image, by default decoded in parallel
+    # by decode_sources()
+    if not force:
+        index = read_world_index(sizes, positions, chunk_size)
+        if index is not None:
+            return index
+
+    stamp = world_stamp(sizes, positions, chunk_size)
+    props = static_props(positions)
+    if load is None:
+        load = decode_sources(sizes, world_sources(positions)).__getitem__
+    background = load(BACKGROUND_KEY)
+    width, height = sizes[BACKGROUND_KEY]
+    placed = [(load(key), pygame.Rect(pos, sizes[key])) for key, pos in props.values()]
+
+    os.makedirs(WORLD_DIR, exist_ok=True)
+    chunks = []
+    for ty in range(0, height, chunk_size):
+        for tx in range(0, width, chunk_size):
+            area = pygame.Rect(tx, ty, min(chunk_size, width - tx), min(chunk_size, height - ty))
+            chunk = pygame.Surface(area.size)
+            chunk.blit(background, (0, 0), area)
+            for surface, rect in placed:
+                if rect.colliderect(area):
+                    chunk.blit(surface, (rect.x - tx, rect.y - ty))
+            cx, cy = tx // chunk_size, ty // chunk_size
+            with open(chunk_path(cx, cy), 'wb') as f:
+                f.write(pygame.image.tobytes(chunk, CHUNK_FORMAT))
+            chunks.append([cx, cy, area.w, area.h])
+
+    index = {
+        'version': CACHE_VERSION,
+        'stamp': stamp,
+        'world_size': [width, height],
+        'chunk_size': chunk_size,
+        'chunks': chunks,
+    }
+    tmp = WORLD_INDEX_PATH + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp, WORLD_INDEX_PATH)
+    return index
+
+
+def atlas_sprites(sizes=IMAGE_SIZES, positions=OBJECT_POSITIONS, max_side=ATLAS_MAX_SIDE):
+    # Small sprites that are drawn on their own rather than baked into the
+    # world; bake_atlas packs the translucent ones
+    baked = set(world_sources(positions))
+    return sorted(key for key, (w, h) in sizes.items() if key not in baked and max(w, h) <= max_side)
+
+
+def sheet_path(n):
+    return os.path.join(ATLAS_DIR, f'sheet_{n}.{PIXEL_FORMAT.lower()}')
+
+
+def pack_shelves(sizes, sheet_size=ATLAS_SHEET_SIZE, padding=ATLAS_PADDING):
+    # Shelf packing, tallest first: sprites fill a row left to right and a
+    # new row starts under the tallest sprite of the last one. Returns one
+    # {key: (x, y)} per sheet and the height each sheet actually uses.
+    sheets, heights = [], []
+    placed = x = y = shelf = None
+    for key in sorted(sizes, key=lambda k: (-sizes[k][1], -sizes[k][0], k)):
+        w, h = sizes[key]
+        if w > sheet_size or h > sheet_size:
+            raise ValueError(f"{key} does not fit in a {sheet_size}px atlas sheet")
+        if placed is not None and x + w > sheet_size:
+            x, y, shelf = 0, y + shelf + padding, 0
+        if placed is None or y + h > sheet_size:
+            placed = {}
+            sheets.append(placed)
+            heights.append(0)
+            x = y = shelf = 0
+        placed[key] = (x, y)
+        x += w + padding
+        shelf = max(shelf, h)
+        heights[-1] = y + shelf
+    return sheets, heights
+
+
+def translucent(data):
+    alpha = data[3::4]
+    return alpha.count(0) + alpha.count(255) != len(alpha)
+
+
+def sprite_pixels(surface):
+    # RGBA bytes of a loaded sprite, with colorkeyed pixels made transparent
+    data = bytearray(pygame.image.tobytes(surface, PIXEL_FORMAT))
+    key = surface.get_colorkey()
+    if key is not None:
+        key = bytes(key[:3])
+        for i in range(0, len(data), 4):
+            if data[i:i + 3] == key:
+                data[i + 3] = 0
+    return data
+
+
+def atlas_stamp(sizes, keys, sheet_size):
+    return {
+        'sheet_size': sheet_size,
+        'sources': {key: source_stamp(key, sizes[key]) for key in keys},
+    }
+
+
+def bake_atlas(sizes=IMAGE_SIZES, keys=None, sheet_size=ATLAS_SHEET_SIZE, force=False, load=None):
+    # Packs the translucent sprites among keys (by default atlas_sprites())
+    # into sheets and returns the atlas index; does nothing but read the index
+    # when it is up to date. load(key) fetches a scaled source image, by
+    # default from the bake cache
+    keys = atlas_sprites(sizes) if keys is None else sorted(keys)
+    stamp = atlas_stamp(sizes, keys, sheet_size)
+    if not force:
+        try:
+            with open(ATLAS_INDEX_PATH) as f:
+                index = json.load(f)
+            if index.get('version') == CACHE_VERSION and index['stamp'] == stamp:
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+
+    if load is None:
+        load = load_images({key: sizes[key] for key in keys}).__getitem__
+    pixels = {key: sprite_pixels(load(key)) for key in keys}
+    packed, heights = pack_shelves({key: sizes[key] for key in keys if translucent(pixels[key])}, sheet_size)
+
+    os.makedirs(ATLAS_DIR, exist_ok=True)
+    sheets = []
+    sprites = {}
+    for n, (placed, height) in enumerate(zip(packed, heights)):
+        data = bytearray(sheet_size * height * 4)
+        for key, (x, y) in placed.items():
+            w, h = sizes[key]
+            row = w * 4
+            for r in range(h):
+                start = ((y + r) * sheet_size + x) * 4
+                data[start:start + row] = pixels[key][r * row:(r + 1) * row]
+            sprites[key] = [n, x, y, w, h]
+        kind, colorkey = classify(data)
+        with open(sheet_path(n), 'wb') as f:
+            f.write(data)
+        sheets.append({'size': [sheet_size, height], 'kind': kind, 'colorkey': colorkey})
+
+    index = {
+        'version': CACHE_VERSION,
+        'stamp': stamp,
+        'sheets': sheets,
+        'sprites': sprites,
+    }
+    tmp = ATLAS_INDEX_PATH + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp, ATLAS_INDEX_PATH)
+    return index
+
+
+def read_sheet(n):
+    with open(sheet_path(n), 'rb') as f:
+        return f.read()
+
+
+def measure(sizes=IMAGE_SIZES):
+    # Compares the old decode-and-scale startup loop against the cached loader
+    start = time.perf_counter()
+    for key, size in sizes.items():
+        pygame.transform.scale(pygame.image.load(source_path(key)), size)
+    decode = time.perf_counter() - start
+
+    bake_all(sizes)
+    start = time.perf_counter()
+    load_images(sizes)
+    cached = time.perf_counter() - start
+    return decode, cached
+
+
+if __name__ == '__main__':
+    pygame.init()
+    if '--measure' in sys.argv:
+        decode, cached = measure()
+        print(f"decode and scale: {decode * 1000:.1f} ms")
+        print(f"baked cache:      {cached * 1000:.1f} ms")
+        print(f"speedup:          {decode / cached:.1f}x")
+    elif '--world' in sys.argv:
+        start = time.perf_counter()
+        index = bake_world(force='--force' in sys.argv)
+        elapsed = time.perf_counter() - start
+        print(f"{len(index['chunks'])} world chunks in {elapsed * 1000:.1f} ms")
+    else:
+        start = time.perf_counter()
+        rebuilt = bake_all(force='--force' in sys.argv)
+        index = bake_world(force='--force' in sys.argv)
+        atlas = bake_atlas(force='--force' in sys.argv)
+        elapsed = time.perf_counter() - start
+        manifest = load_manifest()
+        for key in rebuilt:
+            print(f"baked {key} -> {IMAGE_SIZES[key]} ({manifest['entries'][key]['kind']})")
+        for n, sheet in enumerate(atlas['sheets']):
+            packed = sum(1 for sprite in atlas['sprites'].values() if sprite[0] == n)
+            print(f"atlas sheet {n}: {packed} sprites, {sheet['size'][0]}x{sheet['size'][1]} ({sheet['kind']})")
+        print(f"{len(rebuilt)} of {len(IMAGE_SIZES)} entries rebuilt, "
+              f"{len(index['chunks'])} world chunks, {len(atlas['sprites'])} atlas sprites, "
+              f"in {elapsed * 1000:.1f} ms")
+    pygame.quit()
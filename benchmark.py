@@ -0,0 +1,202 @@
+# Headless frame-time benchmark
+# Imports main.py under SDL's dummy video driver and replays a scripted
+# session: the title and prologue screens, a walk across the whole map, the
+# inventory, and the full quest driven through handle_interaction and
+# handle_choice. Frames run back to back without the frame limiter, so the
+# numbers only depend on the work each frame does.
+#
+# Usage: python benchmark.py [--output results.json]
+import json
+import os
+import subprocess
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+from pygame.locals import *
+
+# Functions in main.py whose time is reported separately
+DRAW_FUNCTIONS = [
+    'draw_world',
+    'draw_dialog',
+    'draw_choices',
+    'draw_inventory',
+    'draw_indicators',
+    'draw_title',
+    'draw_prologue',
+    'draw_game_over',
+    'draw_game_complete',
+]
+
+# Frames to run after each scripted step
+SETTLE_FRAMES = 10
+
+# Serpentine walk over the map, one row of buildings at a time
+WALK = [('goto', (40, 40))]
+for row in range(5):
+    WALK += [('hold', K_d if row % 2 == 0 else K_a, 310), ('hold', K_s, 50)]
+
+SCRIPT = (
+    [('press', K_RETURN)] * 5
+    + WALK
+    + [('press', K_i), ('idle', 30), ('press', K_i)]
+    + [
+        ('interact', 'quest'),
+        ('interact', 'npc1'),
+        ('interact', 'npc2'),
+        ('interact', 'good'),
+        ('interact', 'bad'),
+        ('interact', 'telephone'),
+        ('choose', 1),
+        ('interact', 'bad'),
+        ('press', K_i),
+        ('press', K_i),
+        ('interact', 'good'),
+        ('interact', 'table'),
+        ('choose', 1),
+        ('interact', 'mayor'),
+        ('choose', 1),
+        ('press', K_r),
+    ]
+)
+
+
+class HeldKeys:
+    # Stands in for pygame.key.get_pressed()
+    def __init__(self, held=()):
+        self.held = set(held)
+
+    def __getitem__(self, key):
+        return key in self.held
+
+
+class Timer:
+    def __init__(self):
+        self.totals = {}
+        self.calls = {}
+
+    def wrap(self, name, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.totals[name] = self.totals.get(name, 0.0) + time.perf_counter() - start
+                self.calls[name] = self.calls.get(name, 0) + 1
+        return timed
+
+    def report(self):
+        return {
+            name: {
+                'calls': self.calls[name],
+                'total_ms': round(self.totals[name] * 1000, 3),
+                'mean_ms': round(self.totals[name] * 1000 / self.calls[name], 4),
+            }
+            for name in sorted(self.totals)
+        }
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[round(pct / 100 * (len(ordered) - 1))]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def press(key):
+    pygame.event.post(pygame.event.Event(KEYDOWN, key=key, mod=0, unicode='', scancode=0))
+
+
+def run(game, script=SCRIPT):
+    frame_times = []
+
+    def frame(keys):
+        start = time.perf_counter()
+        for event in pygame.event.get():
+            game.handle_event(event)
+        game.update_world(keys)
+        game.draw_frame()
+        frame_times.append(time.perf_counter() - start)
+
+    idle = HeldKeys()
+    for step in script:
+        action, arg = step[:2]
+        if action == 'press':
+            press(arg)
+            frames, keys = SETTLE_FRAMES, idle
+        elif action == 'hold':
+            frames, keys = step[2], HeldKeys([arg])
+        elif action == 'idle':
+            frames, keys = arg, idle
+        elif action == 'goto':
+            game.teleport(arg)
+            frames, keys = SETTLE_FRAMES, idle
+        elif action == 'interact':
+            game.handle_interaction(arg)
+            frames, keys = SETTLE_FRAMES, idle
+        elif action == 'choose':
+            game.handle_choice(arg)
+            frames, keys = SETTLE_FRAMES, idle
+        else:
+            raise ValueError(f"unknown benchmark step: {action}")
+        for _ in range(frames):
+            frame(keys)
+    return frame_times
+
+
+def main():
+    start = time.perf_counter()
+    import main as game
+    imported = time.perf_counter()
+    game.draw_frame()
+    first_frame = time.perf_counter()
+
+    timer = Timer()
+    for name in DRAW_FUNCTIONS:
+        setattr(game, name, timer.wrap(name, getattr(game, name)))
+    # Drawing through the render queue only queues blits; they run in flush
+    game.render_queue.flush = timer.wrap('render_queue.flush', game.render_queue.flush)
+    game.renderer.present = timer.wrap('present', game.renderer.present)
+
+    frame_times = run(game)
+    ms = [t * 1000 for t in frame_times]
+    results = {
+        'commit': git_commit(),
+        'startup_ms': {
+            'import': round((imported - start) * 1000, 3),
+            'first_frame': round((first_frame - start) * 1000, 3),
+        },
+        'frames': len(ms),
+        'frame_ms': {
+            'p50': round(percentile(ms, 50), 4),
+            'p99': round(percentile(ms, 99), 4),
+            'mean': round(sum(ms) / len(ms), 4),
+            'max': round(max(ms), 4),
+        },
+        'draw_ms': timer.report(),
+        'final_state': game.current_state,
+    }
+    game.shutdown()
+
+    out = json.dumps(results, indent=2)
+    if '--output' in sys.argv:
+        with open(sys.argv[sys.argv.index('--output') + 1], 'w') as f:
+            f.write(out + '\n')
+    print(out)
+
+
+if __name__ == '__main__':
+    main()
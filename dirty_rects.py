@@ -0,0 +1,57 @@
+# Dirty-rectangle tracking
+# Collects the screen regions that changed since the last present. Drawing is
+# clipped to their union and only those regions are pushed to the display, so
+# a frame where nothing changed costs neither a redraw nor a flip.
+import pygame
+
+
+class DirtyRegions:
+    def __init__(self, screen, enabled=True, output=None):
+        # output.present(rects) shows the changed regions of screen, or all of
+        # it when rects is None; by default screen is the display surface
+        self.screen = screen
+        self.enabled = enabled
+        self.output = output
+        self.full = True
+        self.rects = []
+        self._watched = {}
+
+    def invalidate(self, rect=None):
+        # No rect means the whole screen
+        if rect is None or not self.enabled:
+            self.full = True
+        else:
+            rect = pygame.Rect(rect).clip(self.screen.get_rect())
+            if rect.w and rect.h:
+                self.rects.append(rect)
+
+    def watch(self, name, value):
+        # Returns (changed, previous value) and remembers value for next time
+        previous = self._watched.get(name)
+        self._watched[name] = value
+        return previous != value, previous
+
+    def forget(self):
+        self._watched.clear()
+
+    @property
+    def dirty(self):
+        return self.full or bool(self.rects)
+
+    def clip_rect(self):
+        if self.full:
+            return self.screen.get_rect()
+        return self.rects[0].unionall(self.rects[1:])
+
+    def present(self):
+        if self.output is not None:
+            if self.full:
+                self.output.present(None)
+            elif self.rects:
+                self.output.present(self.rects)
+        elif self.full:
+            pygame.display.flip()
+        elif self.rects:
+            pygame.display.update(self.rects)
+        self.full = False
+        self.rects = []
@@ -0,0 +1,215 @@
+# Lazy image loading
+# Surfaces are loaded from the bake cache the first time they are asked for and
+# kept in an LRU bounded by a memory budget. Each game state declares the
+# assets it needs; entering a state pins those, drops art that belongs only to
+# other states, and prefetches the next state's assets on a worker thread.
+# Surfaces come back already converted to the display format.
+#
+# When the bake cache is cold, warm_up() decodes and scales the stale entries
+# on a thread pool; pygame releases the GIL while decoding PNGs and scaling,
+# so this uses every core. get() only waits for the entry it asks for, so the
+# title screen shows as soon as its own art is ready.
+#
+# Once load_atlas() has read the atlas sheets (see bake_atlas), the small
+# sprites packed into them are served as subsurfaces of the sheets. They stay
+# loaded for the rest of the game and are never evicted.
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+from bake_assets import (bake_image, ensure_baked, is_stale, load_manifest, read_sheet, save_manifest,
+                         source_stamp, surface_from_bytes)
+
+# Default budget in bytes; 32 bits per pixel
+DEFAULT_BUDGET = 24 * 1024 * 1024
+
+
+def surface_bytes(size):
+    return size[0] * size[1] * 4
+
+
+class ImageManager:
+    def __init__(self, sizes, state_assets=None, budget=DEFAULT_BUDGET):
+        self.sizes = sizes
+        self.state_assets = state_assets or {}
+        self.budget = budget
+        self.pinned = set()
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.atlas = {}
+        self._surfaces = OrderedDict()
+        self._pending = {}
+        self._futures = {}
+        self._executor = None
+        self._threads = []
+        self._closed = False
+        self._lock = threading.Lock()
+        self._manifest_lock = threading.Lock()
+        self._manifest = load_manifest()
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def get(self, key):
+        sprite = self.atlas.get(key)
+        if sprite is not None:
+            self.hits += 1
+            return sprite
+        with self._lock:
+            surface = self._surfaces.get(key)
+            if surface is not None:
+                self._surfaces.move_to_end(key)
+                self.hits += 1
+                return surface
+            self.misses += 1
+        return self._load(key)
+
+    def _load(self, key):
+        # Only one thread decodes a given key; the others wait for it
+        with self._lock:
+            if key in self._surfaces:
+                return self._surfaces[key]
+            done = self._pending.get(key)
+            owner = done is None
+            if owner:
+                done = self._pending[key] = threading.Event()
+        if not owner:
+            done.wait()
+            with self._lock:
+                surface = self._surfaces.get(key)
+            return surface if surface is not None else self._load(key)
+
+        try:
+            size = self.sizes[key]
+            with self._lock:
+                future = self._futures.pop(key, None)
+            try:
+                data, entry = future.result() if future is not None else (None, None)
+            except CancelledError:
+                future = None
+            if future is not None:
+                entry['stamp'] = source_stamp(key, size)
+                with self._manifest_lock:
+                    self._manifest['entries'][key] = entry
+                    save_manifest(self._manifest)
+            else:
+                with self._manifest_lock:
+                    data, entry, rebuilt = ensure_baked(self._manifest, key, size)
+                    if rebuilt:
+                        save_manifest(self._manifest)
+            # The decoded pixels are wrapped, not copied, until converted
+            surface = surface_from_bytes(data, size, entry)
+            with self._lock:
+                self._store(key, surface)
+            return surface
+        finally:
+            with self._lock:
+                del self._pending[key]
+            done.set()
+
+    def warm_up(self, keys, workers=None):
+        # Starts decoding the stale entries among keys, in the given order
+        with self._manifest_lock:
+            stale = [key for key in keys if is_stale(self._manifest, key, self.sizes[key])]
+        with self._lock:
+            stale = [key for key in stale if key not in self._futures and key not in self._surfaces]
+        if not stale:
+            return 0
+        executor = self._executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+        with self._lock:
+            for key in stale:
+                self._futures[key] = executor.submit(bake_image, key, self.sizes[key])
+        executor.shutdown(wait=False)
+        return len(stale)
+
+    def load_atlas(self, build):
+        # build() bakes the atlas if needed and returns its index
+        index = build()
+        sheets = []
+        for n, entry in enumerate(index['sheets']):
+            sheet = surface_from_bytes(read_sheet(n), tuple(entry['size']), entry)
+            sheets.append(sheet)
+        atlas = {key: sheets[n].subsurface((x, y, w, h)) for key, (n, x, y, w, h) in index['sprites'].items()}
+        with self._lock:
+            self.atlas = atlas
+            self.used += sum(surface_bytes(entry['size']) for entry in index['sheets'])
+            for key in atlas:
+                self._drop(key)
+        return atlas
+
+    def load_atlas_async(self, build):
+        return self._start(self.load_atlas, build)
+
+    def _start(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        self._threads = [t for t in self._threads if t.is_alive()] + [thread]
+        thread.start()
+        return thread
+
+    def close(self):
+        # Cancels queued decodes and waits for the ones in flight; call before
+        # pygame.quit() so no worker touches pygame after it has shut down
+        self._closed = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        for thread in self._threads:
+            thread.join()
+
+    def _store(self, key, surface):
+        self._surfaces[key] = surface
+        self._surfaces.move_to_end(key)
+        self.used += surface_bytes(self.sizes[key])
+        self._evict()
+
+    def _evict(self):
+        # Least recently used first; assets pinned by the current state stay
+        for key in list(self._surfaces):
+            if self.used <= self.budget:
+                break
+            if key not in self.pinned:
+                self._drop(key)
+
+    def _drop(self, key):
+        if self._surfaces.pop(key, None) is not None:
+            self.used -= surface_bytes(self.sizes[key])
+
+    def release(self, keys):
+        with self._lock:
+            for key in keys:
+                if key not in self.pinned:
+                    self._drop(key)
+
+    def prefetch(self, keys):
+        with self._lock:
+            missing = [k for k in keys if k not in self._surfaces and k not in self._pending and k not in self.atlas]
+        if missing and not self._closed:
+            return self._start(self._prefetch, missing)
+        return None
+
+    def _prefetch(self, keys):
+        for key in keys:
+            if self._closed:
+                break
+            self._load(key)
+
+    def enter_state(self, state, upcoming=()):
+        # Pin this state's assets, release art owned only by other states and
+        # warm up whatever the upcoming states will need
+        wanted = set(self.state_assets.get(state, ()))
+        with self._lock:
+            self.pinned = wanted
+        soon = set()
+        for other in upcoming:
+            soon.update(self.state_assets.get(other, ()))
+        stale = set()
+        for other, keys in self.state_assets.items():
+            if other != state:
+                stale.update(keys)
+        self.release(stale - wanted - soon)
+        self.prefetch(sorted(wanted) + sorted(soon - wanted))
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
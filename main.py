@@ -2,28 +2,46 @@ import pygame
 from pygame.locals import *
 import sys
 import os
-import textwrap
+import struct
 from image_sizes import IMAGE_SIZES
 from object_positions import OBJECT_POSITIONS
+from image_manager import ImageManager
+import text_cache
+from text_cache import render_text, render_wrapped
+from dirty_rects import DirtyRegions
+from render_queue import RenderQueue
+from ui_resources import UIResources
+from scheduler import AdaptiveClock
+from world_layer import ChunkedWorldLayer
+from bake_assets import bake_atlas, open_world_index, start_world_bake
+from perf import PerfMonitor
+from physics import lerp
+from simulation import PLAYER_KEY, SIM_STEP, Simulation
+from snapshot import Snapshot, slot_path, SLOTS
+from presenter import LOGICAL_SIZE, Presenter
 
 # Initialize Pygame
 pygame.init()
-screen = pygame.display.set_mode((1280, 720))
-pygame.display.set_caption("Echo Of Lies")
-clock = pygame.time.Clock()
 
-# World size
-WORLD_WIDTH = 1600
-WORLD_HEIGHT = 1200
-
-# Base image path
-img_path = 'img/'
-
-# Load and scale images
-images = {}
-for key, size in IMAGE_SIZES.items():
-    path = os.path.join(img_path, *key.split('/'))
-    images[key] = pygame.transform.scale(pygame.image.load(path), size)
+# Everything is drawn into a fixed-size back-buffer, which the presenter
+# scales to the window (see presenter.py); coordinates below are logical
+SCREEN_WIDTH, SCREEN_HEIGHT = LOGICAL_SIZE
+ACCELERATED_PRESENT = True
+presenter = Presenter(LOGICAL_SIZE, title="Echo Of Lies", accelerated=ACCELERATED_PRESENT)
+screen = presenter.surface
+
+# The simulation ticks at a fixed rate (SIM_STEP, see simulation.py);
+# rendering interpolates between ticks. With the accelerated presenter each
+# present waits for vsync, so rendering runs at the display's refresh rate and
+# the clock doesn't cap it; the software presenter has no vsync and renders
+# at up to RENDER_FPS
+RENDER_FPS = 144
+MAX_FRAME_TIME = 0.25
+clock = AdaptiveClock(0 if presenter.vsync else RENDER_FPS)
+
+# Only redraw and present the parts of the screen that changed
+DIRTY_RENDERING = True
+renderer = DirtyRegions(screen, enabled=DIRTY_RENDERING, output=presenter)
 
 # Game states
 STATE_TITLE = 'title'
@@ -31,7 +49,6 @@ STATE_PROLOGUE = 'prologue'
 STATE_PLAYING = 'playing'
 STATE_GAME_OVER = 'game_over'
 STATE_GAME_COMPLETE = 'game_complete'
-current_state = STATE_TITLE
 prologue_index = 0
 prologue_texts = [
     "The year is 2045. The world is powered by AI-driven platforms that control entertainment, news, and even daily decisions. At first, it was a golden age: peace, efficiency, and endless creativity.",
@@ -46,158 +63,175 @@ prologue_images = [
     'main character/prolongue_4.png'  # Last prologue screen is text-only on black background
 ]
 
-# Player class
-class Player(pygame.sprite.Sprite):
-    def __init__(self):
-        super().__init__()
-        self.image = images['main character/detective.png']
-        self.rect = self.image.get_rect()
-        self.rect.center = (800, 600)
-        self.speed = 5
-
-    def update(self, keys, collidables):
-        dx = 0
-        dy = 0
-        if keys[K_w]:
-            dy -= self.speed
-        if keys[K_s]:
-            dy += self.speed
-        if keys[K_a]:
-            dx -= self.speed
-        if keys[K_d]:
-            dx += self.speed
-
-        # Check horizontal movement
-        self.rect.x += dx
-        if pygame.sprite.spritecollideany(self, collidables):
-            self.rect.x -= dx
-
-        # Check vertical movement
-        self.rect.y += dy
-        if pygame.sprite.spritecollideany(self, collidables):
-            self.rect.y -= dy
-
-        # Boundary checks
-        self.rect.x = max(0, min(self.rect.x, WORLD_WIDTH - self.rect.width))
-        self.rect.y = max(0, min(self.rect.y, WORLD_HEIGHT - self.rect.height))
-
-# Sprite class for objects
-class GameObject(pygame.sprite.Sprite):
-    def __init__(self, image, pos, name, interactable=False, collidable=False):
-        super().__init__()
-        self.image = image
-        self.rect = self.image.get_rect(topleft=pos)
-        self.name = name
-        self.interactable = interactable
-        self.collidable = collidable
-
-# Sprite groups
-all_sprites = pygame.sprite.Group()
-interactables = pygame.sprite.Group()
-collidables = pygame.sprite.Group()
-
-player = Player()
-all_sprites.add(player)
-
-# Place objects
-objects = {}
-for name, (image_key, pos, interactable, collidable) in OBJECT_POSITIONS.items():
-    obj = GameObject(images[image_key], pos, name, interactable=interactable, collidable=collidable)
-    objects[name] = obj
-    all_sprites.add(obj)
-    if interactable:
-        interactables.add(obj)
-    if collidable:
-        collidables.add(obj)
-
-# NPC images dict
-npc_images = {
-    'npc1': images['interactable/npc.png'],
-    'npc2': images['interactable/npc.png'],
-    'good': images['interactable/npc_good.png'],
-    'bad': images['interactable/npc_bad.png']
+# Images each state draws, and the states that can follow it
+STATE_ASSETS = {
+    STATE_TITLE: ['main character/game_title.png'],
+    STATE_PROLOGUE: prologue_images,
+    STATE_PLAYING: sorted({
+        'main character/detective.png',
+        'main character/interact.png',
+        'main character/inventory.png',
+        'evidence/poster_fake.png',
+        'evidence/poster_real.png',
+    } | {image_key for image_key, _, interactable, _ in OBJECT_POSITIONS.values() if interactable}),
+    STATE_GAME_OVER: ['main character/game_over.png'],
+    STATE_GAME_COMPLETE: ['main character/game_complete.png'],
+}
+NEXT_STATES = {
+    STATE_TITLE: [STATE_PROLOGUE],
+    STATE_PROLOGUE: [STATE_PLAYING],
+    STATE_PLAYING: [STATE_GAME_OVER, STATE_GAME_COMPLETE],
+    STATE_GAME_OVER: [STATE_PLAYING],
+    STATE_GAME_COMPLETE: [STATE_PLAYING],
 }
 
-# First quest dialogs
-first_quest_dialogs = {
-    'npc1': "I saw smoke coming from the mayor's mansion last night. That was the start.",
-    'npc2': "Then, fake posters started appearing all over the city.",
-    'good': "After the fire, the mayor was seen leaving the town hurriedly.",
-    'bad': "The mayor left because the posters revealed he's an AI. Posters came first!"
+# Images are loaded from the bake cache (see bake_assets.py) on first use
+images = ImageManager(IMAGE_SIZES, STATE_ASSETS)
+
+# Background and static props, streamed around the camera. They are baked
+# into chunks offline (see bake_assets.py); a missing or stale bake runs in a
+# separate process during startup and the layer waits for it when the world
+# is first needed
+world_layer = ChunkedWorldLayer()
+world_bake = start_world_bake()
+
+def build_world():
+    return open_world_index(world_bake)
+
+# With a cold cache, decode everything in parallel, title screen first
+images.warm_up([key for state in NEXT_STATES for key in STATE_ASSETS[state]])
+
+# Small sprites are drawn from atlas sheets (see bake_atlas) once these are
+# read; until then each sprite is loaded on its own
+images.load_atlas_async(lambda: bake_atlas(load=images.get))
+
+def set_state(state):
+    global current_state
+    current_state = state
+    renderer.invalidate()
+    renderer.forget()
+    images.enter_state(state, NEXT_STATES[state])
+    if world_layer.dirty and STATE_PLAYING in NEXT_STATES[state]:
+        world_layer.prepare_async(build_world)
+
+set_state(STATE_TITLE)
+
+# The game itself: the player, world objects and quest all live in the
+# simulation (see simulation.py); this file adds the screens, input and drawing
+sim = Simulation()
+# The world is as large as the background's entry in IMAGE_SIZES
+WORLD_WIDTH, WORLD_HEIGHT = sim.world.bounds
+quest_engine = sim.world.engine
+ENDING_STATES = {'game_over': STATE_GAME_OVER, 'game_complete': STATE_GAME_COMPLETE}
+
+# Where the player stood at the previous tick, for interpolated drawing
+player_prev = (sim.x, sim.y)
+player_view = pygame.Rect(sim.player_rect.x, sim.player_rect.y, *sim.world.player_size)
+
+# NPC image keys
+npc_images = {
+    'npc1': 'interactable/npc.png',
+    'npc2': 'interactable/npc.png',
+    'good': 'interactable/npc_good.png',
+    'bad': 'interactable/npc_bad.png'
 }
+# Saves record the portrait shown; any speaker with that portrait restores it
+npc_speakers = {image_key: name for name, image_key in npc_images.items()}
 
-# Game state variables
-quest_started = False
-npcs_interacted = set()
-reported = False
-has_fake_poster = False
-decoded = False
-confronted = False
-has_real_poster = False
-evidence_destroyed = False
-current_dialog = ""
-current_npc_img = None
-show_choice = False
-choices = []
+# Presentation state; the choice menu's cursor is the only part of the
+# playing state that isn't the simulation's
 selected_choice = 0
-choice_context = ""
-total_npcs = {'npc1', 'npc2', 'good', 'bad'}
-game_over = False
-game_over_message = ""
-inventory = []
-show_inventory = False
 
-# Font for text
-font = pygame.font.Font("/home/ashuranoryoshi/Desktop/game2/minecraft/Minecraft.ttf", 24)  
+# Fresh game, restored by reset_game; F5 quick-saves, F6 picks the slot, F9 loads
+INITIAL_SNAPSHOT = Snapshot(STATE_PLAYING, quest_engine.start, (), (), (sim.x, sim.y))
+quick_slot = 1
 
-def wrap_text(text, width=70):
-    paras = text.split('\n')
-    lines = []
-    for p in paras:
-        lines.extend(textwrap.wrap(p, width=width))
-    return lines
+# Font for text
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'minecraft', 'Minecraft.ttf')
+font = pygame.font.Font(FONT_PATH, 24)
+
+# Performance overlay, toggled with F3; F4 profiles the next frames to disk
+perf = PerfMonitor()
+perf_font = pygame.font.Font(FONT_PATH, 14)
+PERF_RECT = pygame.Rect(890, 10, 300, 192)
+PERF_SECTIONS = ['events', 'update', 'world', 'dialog', 'inventory', 'blit', 'present']
+PERF_REFRESH_MS = 250
+perf_refreshed = 0
+
+# Render layers, drawn bottom to top; each is submitted with one blits call
+LAYER_WORLD = 0
+LAYER_SPRITES = 1
+LAYER_DIALOG = 2
+LAYER_CHOICES = 3
+LAYER_INVENTORY = 4
+LAYER_HUD = 5
+LAYER_OVERLAY = 6
+render_queue = RenderQueue()
+
+# Portraits, panels and the indicator composite are built once (see
+# ui_resources.py) and rebuilt only after the window is resized
+ui = UIResources(images.get)
 
 def draw_dialog(text, npc_img=None):
-    pygame.draw.rect(screen, (0, 0, 0, 180), (0, 620, 1280, 100))
+    # The dialog box is opaque on the display surface
+    render_queue.add(LAYER_DIALOG, ui.panel((1280, 100), (0, 0, 0)), (0, 620))
     x = 10
     if npc_img:
-        small = pygame.transform.scale(npc_img, (40, 40))
-        screen.blit(small, (10, 630))
+        render_queue.add(LAYER_DIALOG, ui.scaled(npc_img, (40, 40)), (10, 630))
         x = 60
-    lines = wrap_text(text, width=100 if npc_img else 110)
-    for i, line in enumerate(lines[:3]):
-        screen.blit(font.render(line, True, (255, 255, 255)), (x, 630 + i * 30))
+    lines = render_wrapped(font, text, (255, 255, 255), 100 if npc_img else 110, 3)
+    for i, line in enumerate(lines):
+        render_queue.add(LAYER_DIALOG, line, (x, 630 + i * 30))
 
 def draw_inventory():
-    inventory_bg = pygame.Surface((880, 520), pygame.SRCALPHA)
-    inventory_bg.fill((0, 0, 139, 153)) # Dark blue with 60% opacity
-    screen.blit(inventory_bg, (200, 100))
+    inventory_bg = ui.panel((880, 520), (0, 0, 139, 153)) # Dark blue with 60% opacity
+    render_queue.add(LAYER_INVENTORY, inventory_bg, (200, 100))
 
-    text = font.render("Inventory (Press I to close)", True, (255, 255, 255))
-    screen.blit(text, (500, 120))
+    text = render_text(font, "Inventory (Press I to close)", (255, 255, 255))
+    render_queue.add(LAYER_INVENTORY, text, (500, 120))
     
-    if 'fake_poster' in inventory:
-        text = font.render("Fake Poster", True, (255, 255, 255))
-        screen.blit(text, (250, 180))
-        screen.blit(images['evidence/poster_fake.png'], (250, 220))
+    if 'fake_poster' in sim.quest.inventory:
+        text = render_text(font, "Fake Poster", (255, 255, 255))
+        render_queue.add(LAYER_INVENTORY, text, (250, 180))
+        render_queue.add(LAYER_INVENTORY, images['evidence/poster_fake.png'], (250, 220))
     
-    if 'real_poster' in inventory:
-        text = font.render("Real Poster", True, (255, 255, 255))
-        screen.blit(text, (650, 180))
-        screen.blit(images['evidence/poster_real.png'], (650, 220))
+    if 'real_poster' in sim.quest.inventory:
+        text = render_text(font, "Real Poster", (255, 255, 255))
+        render_queue.add(LAYER_INVENTORY, text, (650, 180))
+        render_queue.add(LAYER_INVENTORY, images['evidence/poster_real.png'], (650, 220))
+
+def indicator_pieces():
+    return [
+        (images['main character/inventory.png'], (1200, 10)),
+        (images['main character/interact.png'], (1230, 10)),
+        (render_text(font, "I", (255, 255, 255)), (1215, 50)),
+        (render_text(font, "E", (255, 255, 255)), (1245, 50)),
+    ]
 
 def draw_indicators():
-    screen.blit(images['main character/inventory.png'], (1200, 10))
-    screen.blit(images['main character/interact.png'], (1230, 10))
-    text = font.render("I", True, (255, 255, 255))
-    screen.blit(text, (1215, 50))
-    text = font.render("E", True, (255, 255, 255))
-    screen.blit(text, (1245, 50))
+    render_queue.add(LAYER_HUD, *ui.composite('indicators', indicator_pieces))
+
+def draw_perf_overlay():
+    render_queue.add(LAYER_OVERLAY, ui.panel(PERF_RECT.size, (0, 0, 0, 160)), PERF_RECT.topleft)
+    lines = [f"FPS {clock.get_fps():.1f}  frame {perf.frame_ms():.2f} ms"]
+    for name in PERF_SECTIONS:
+        lines.append(f"{name}: {perf.mean_ms(name):.2f} ms")
+    lines.append(f"world blits: {perf.mean_count('blits'):.0f}")
+    text_info = text_cache.cache_info()['lines']
+    text_total = text_info.hits + text_info.misses
+    text_rate = text_info.hits / text_total if text_total else 0.0
+    lines.append(f"cache hits: text {text_rate:.0%}  images {images.hit_rate():.0%}")
+    if perf.profiling:
+        lines.append("profiling...")
+    elif perf.last_profile:
+        lines.append("saved " + os.path.basename(perf.last_profile))
+    for i, line in enumerate(lines):
+        render_queue.add(LAYER_OVERLAY, perf_font.render(line, True, (0, 255, 0)), (PERF_RECT.x + 8, PERF_RECT.y + 6 + i * 16))
 
 def draw_title():
     screen.fill((0, 0, 0))
     screen.blit(images['main character/game_title.png'], (0, 0))  # Center: (1280-600)/2, (720-520)/2
-    text = font.render("Press ENTER to start", True, (255, 255, 255))
+    text = render_text(font, "Press ENTER to start", (255, 255, 255))
     screen.blit(text, (500, 650))
 
 def draw_prologue(index):
@@ -205,255 +239,339 @@ def draw_prologue(index):
     if prologue_images[index]:
         screen.blit(images[prologue_images[index]], (0, 0))
 
-    # Create a semi-transparent surface for the text background
-    text_bg = pygame.Surface((1280, 220), pygame.SRCALPHA)
-    text_bg.fill((0, 0, 0, 180))  # Black with 70% opacity
+    # Semi-transparent text background
+    text_bg = ui.panel((1280, 220), (0, 0, 0, 180))  # Black with 70% opacity
     screen.blit(text_bg, (0, 500))
 
-    lines = wrap_text(prologue_texts[index], width=110)
+    lines = render_wrapped(font, prologue_texts[index], (255, 255, 255), 110)
     for i, line in enumerate(lines):
-        text = font.render(line, True, (255, 255, 255))
-        screen.blit(text, (100, 520 + i * 30))
-    text = font.render("Press ENTER to continue", True, (255, 255, 255))
+        screen.blit(line, (100, 520 + i * 30))
+    text = render_text(font, "Press ENTER to continue", (255, 255, 255))
     screen.blit(text, (500, 650))
 
 def draw_game_over():
     screen.fill((0, 0, 0))
     screen.blit(images['main character/game_over.png'], (340, 100))
-    text = font.render(game_over_message, True, (255, 0, 0))
+    text = render_text(font, sim.message, (255, 0, 0))
     screen.blit(text, (500, 500))
-    text = font.render("Press ESC to quit or R to reload", True, (255, 255, 255))
+    text = render_text(font, "Press ESC to quit or R to reload", (255, 255, 255))
     screen.blit(text, (500, 550))
 
 def draw_game_complete():
     screen.fill((0, 0, 0))
     screen.blit(images['main character/game_complete.png'], (340, 100))
-    text = font.render("Congratulations! You solved the case!", True, (0, 255, 0))
+    text = render_text(font, "Congratulations! You solved the case!", (0, 255, 0))
     screen.blit(text, (500, 500))
-    text = font.render("Press ESC to quit or R to reload", True, (255, 255, 255))
+    text = render_text(font, "Press ESC to quit or R to reload", (255, 255, 255))
     screen.blit(text, (500, 550))
 
+def capture():
+    player_rect = sim.player_rect
+    return Snapshot(current_state, sim.quest.node, sim.quest.met, sim.quest.inventory, (player_rect.x, player_rect.y),
+                    sim.dialog, npc_images.get(sim.speaker), sim.choice is not None, sim.choice or '',
+                    selected_choice, sim.show_inventory, sim.message)
+
+def teleport(topleft):
+    global player_prev
+    sim.x, sim.y = player_prev = topleft
+
+def restore(snap):
+    global selected_choice
+    # Check everything first so a bad snapshot leaves the game untouched
+    if snap.state not in NEXT_STATES:
+        raise ValueError(f"unknown game state in snapshot: {snap.state}")
+    if snap.node not in quest_engine.nodes:
+        raise ValueError(f"unknown quest node in snapshot: {snap.node}")
+    if snap.choice_context and snap.choice_context not in quest_engine.choices:
+        raise ValueError(f"unknown quest choice in snapshot: {snap.choice_context}")
+    if snap.choice_context and snap.selected_choice >= len(quest_engine.choices[snap.choice_context].texts):
+        raise ValueError(f"choice out of range in snapshot: {snap.selected_choice}")
+    if snap.npc_img is not None and snap.npc_img not in npc_speakers:
+        raise ValueError(f"unknown portrait in snapshot: {snap.npc_img}")
+    sim.quest.node = snap.node
+    sim.quest.met = set(snap.met)
+    sim.quest.inventory = list(snap.inventory)
+    teleport(snap.player_pos)
+    sim.dialog = snap.dialog
+    sim.speaker = npc_speakers.get(snap.npc_img)
+    sim.choice = snap.choice_context if snap.show_choice and snap.choice_context else None
+    sim.show_inventory = snap.show_inventory
+    sim.ending = next((ending for ending, state in ENDING_STATES.items() if state == snap.state), None)
+    sim.message = snap.game_over_message
+    selected_choice = snap.selected_choice
+    set_state(snap.state)
+
 def reset_game():
-    global quest_started, npcs_interacted, reported, has_fake_poster, decoded, confronted, has_real_poster, evidence_destroyed, current_dialog, current_npc_img, show_choice, choices, selected_choice, choice_context, game_over, game_over_message, inventory, show_inventory, current_state
-    quest_started = False
-    npcs_interacted = set()
-    reported = False
-    has_fake_poster = False
-    decoded = False
-    confronted = False
-    has_real_poster = False
-    evidence_destroyed = False
-    current_dialog = ""
-    current_npc_img = None
-    show_choice = False
-    choices = []
-    selected_choice = 0
-    choice_context = ""
-    game_over = False
-    game_over_message = ""
-    inventory = []
-    show_inventory = False
-    player.rect.center = (800, 600)
-    current_state = STATE_PLAYING
-
-# Function to handle interactions
-def handle_interaction(obj):
-    global quest_started, npcs_interacted, reported, has_fake_poster, decoded, has_real_poster, confronted, current_dialog, current_npc_img, show_choice, choices, choice_context, evidence_destroyed, game_over, game_over_message, inventory, current_state
-
-    if game_over:
-        return
+    restore(INITIAL_SNAPSHOT)
 
-    current_npc_img = None
-    show_choice = False
-
-    if obj.name == 'quest' and not quest_started:
-        quest_started = True
-        current_dialog = "Quest started: Interact with all NPCs to learn about the situation in the city."
-
-    elif obj.name in total_npcs and quest_started:
-        current_npc_img = npc_images[obj.name]
-        if not reported:
-            npcs_interacted.add(obj.name)
-            current_dialog = first_quest_dialogs[obj.name]
-            if len(npcs_interacted) == len(total_npcs):
-                current_dialog += "\n\nAll NPCs interacted. Now report the order of events via telephone."
-        elif reported:
-            if obj.name == 'bad' and not has_fake_poster:
-                current_dialog = "You confront the NPC about spreading fake rumors.\n'Fine, take this poster as evidence. \n see it in your inventory'"
-                has_fake_poster = True
-                if 'fake_poster' not in inventory:
-                    inventory.append('fake_poster')
-            elif obj.name == 'good' and has_fake_poster and not decoded:
-                current_dialog = "That poster seems fake. Go to the detective table and properly investigate it."
-            else:
-                current_dialog = "I've told you everything I know."
-
-    elif obj.name == 'telephone' and quest_started and len(npcs_interacted) == len(total_npcs) and not reported:
-        show_choice = True
-        choices = [
-            "Report order: Fire, posters, mayor left.",
-            "Report order: Fire, mayor left, posters.",
-            "Report order: Posters, fire, mayor left."
-        ]
-        choice_context = "report"
-        current_dialog = "Choose the correct order of events to report:"
-
-    elif obj.name == 'table' and has_fake_poster and not decoded:
-        show_choice = True
-        choices = ["Add strong acid to photo", "Properly investigate the photo"]
-        choice_context = "decode"
-        current_dialog = "What to do with the poster?"
-
-    elif obj.name == 'mayor' and has_real_poster and not confronted:
-        show_choice = True
-        choices = ["Mayor is AI", "Mayor is not AI"]
-        choice_context = "confront"
-        current_dialog = "Confront the mayor: Is he AI?"
+def load_game(path):
+    restore(Snapshot.load(path))
 
+def quick_save():
+    try:
+        capture().save(slot_path(quick_slot))
+    except (OSError, struct.error):
+        sim.dialog = f"Slot {quick_slot} could not be saved."
+        return
+    sim.dialog = f"Game saved to slot {quick_slot}."
+
+def quick_load():
+    path = slot_path(quick_slot)
+    if not os.path.exists(path):
+        if current_state == STATE_PLAYING:
+            sim.dialog = f"Slot {quick_slot} is empty."
+        return
+    try:
+        load_game(path)
+    except (OSError, ValueError):
+        if current_state == STATE_PLAYING:
+            sim.dialog = f"Slot {quick_slot} could not be loaded."
+
+# Switches to the ending screen once the quest is over
+def apply_outcome(outcome):
+    if outcome is not None and outcome.ending:
+        set_state(ENDING_STATES[outcome.ending])
+
+# E where the player stands; a name walks the player up to that object first
+def handle_interaction(name=None):
+    if name is None:
+        apply_outcome(sim.interact())
     else:
-        if obj.name == 'table' and evidence_destroyed:
-            current_dialog = "The evidence is destroyed. Nothing left to do."
-        elif obj.name == 'mayor' and not has_real_poster:
-            current_dialog = "I need evidence before confronting the mayor."
-        else:
-            current_dialog = "Nothing to do here right now."
+        apply_outcome(sim.step(('interact', name)))
+        teleport((sim.x, sim.y))
 
 # Function to handle choice selection
 def handle_choice(idx):
-    global reported, decoded, has_real_poster, confronted, current_dialog, show_choice, choice_context, evidence_destroyed, has_fake_poster, game_over, game_over_message, inventory, current_state
-
-    if game_over:
-        return
-
-    if choice_context == "report":
-        if idx == 1:  # Correct order
-            reported = True
-            current_dialog = "Correct order reported. The suspect is spreading fake rumors. Confront the suspect."
-        else:
-            current_dialog = "Incorrect order. Gather more info or try again."
-        show_choice = False
-        choice_context = ""
-
-    elif choice_context == "decode":
-        if idx == 0:  # Acid
-            evidence_destroyed = True
-            has_fake_poster = False
-            decoded = True
-            current_dialog = "The acid destroys the poster. Evidence lost."
-            game_over = True
-            game_over_message = "Evidence destroyed. Game Over."
-            current_state = STATE_GAME_OVER
-            if 'fake_poster' in inventory:
-                inventory.remove('fake_poster')
-        else:  # Investigate
-            decoded = True
-            has_real_poster = True
-            has_fake_poster = False
-            current_dialog = "Proper investigation reveals the real poster. \n view in your inventory and confront the mayor"
-            if 'fake_poster' in inventory:
-                inventory.remove('fake_poster')
-            if 'real_poster' not in inventory:
-                inventory.append('real_poster')
-        show_choice = False
-        choice_context = ""
-
-    elif choice_context == "confront":
-        confronted = True
-        if idx == 0:
-            current_dialog = "You chose: Mayor is AI."
-            game_over_message = "Mayor is AI. Game Over."
-            current_state = STATE_GAME_OVER
-        else:
-            current_dialog = "You chose: Mayor is not AI."
-            game_over_message = "Mayor is not AI. Game Complete."
-            current_state = STATE_GAME_COMPLETE
-        show_choice = False
-        choice_context = ""
+    apply_outcome(sim.choose(idx))
 
 # Camera function
 def get_camera_offset(player_rect):
-    cam_x = player_rect.centerx - 640  # Half screen width
-    cam_y = player_rect.centery - 360  # Half screen height
-    cam_x = max(0, min(cam_x, WORLD_WIDTH - 1280))
-    cam_y = max(0, min(cam_y, WORLD_HEIGHT - 720))
+    cam_x = player_rect.centerx - SCREEN_WIDTH // 2
+    cam_y = player_rect.centery - SCREEN_HEIGHT // 2
+    cam_x = max(0, min(cam_x, WORLD_WIDTH - SCREEN_WIDTH))
+    cam_y = max(0, min(cam_y, WORLD_HEIGHT - SCREEN_HEIGHT))
     return -cam_x, -cam_y
 
-# Main game loop
-running = True
-while running:
-    for event in pygame.event.get():
-        if event.type == QUIT:
-            running = False
-        if event.type == KEYDOWN:
-            if event.key == K_ESCAPE:
-                running = False
-            if current_state == STATE_TITLE:
-                if event.key == K_RETURN:
-                    current_state = STATE_PROLOGUE
-            elif current_state == STATE_PROLOGUE:
+# Screen regions covered by the playing-state overlays
+DIALOG_RECT = pygame.Rect(0, 620, 1280, 100)
+CHOICE_RECT = pygame.Rect(0, 500, 1280, 120)
+INVENTORY_RECT = pygame.Rect(200, 100, 880, 520)
+
+def mark_playing_dirty(offset):
+    # A camera scroll repaints everything; otherwise only the player's old and
+    # new position and the overlays whose contents changed
+    if renderer.watch('camera', offset)[0]:
+        renderer.invalidate()
+    player_rect = player_view.move(offset)
+    moved, previous = renderer.watch('player', player_rect)
+    if moved:
+        renderer.invalidate(player_rect)
+        if previous is not None:
+            renderer.invalidate(previous)
+    if renderer.watch('dialog', (sim.dialog, sim.speaker))[0]:
+        renderer.invalidate(DIALOG_RECT)
+    if renderer.watch('choice', (sim.choice, selected_choice))[0]:
+        renderer.invalidate(CHOICE_RECT)
+    if renderer.watch('inventory', (sim.show_inventory, tuple(sim.quest.inventory)))[0]:
+        renderer.invalidate(INVENTORY_RECT)
+
+# Keys that keep the loop ticking while held
+MOVEMENT_KEYS = (K_w, K_a, K_s, K_d)
+
+def movement_held():
+    keys = pygame.key.get_pressed()
+    return any(keys[k] for k in MOVEMENT_KEYS)
+
+# Event handling; returns False when the game should quit
+def handle_event(event):
+    global prologue_index, selected_choice, quick_slot
+    if event.type == QUIT:
+        return False
+    if event.type == VIDEOEXPOSE:
+        renderer.invalidate()
+    if event.type in (VIDEORESIZE, WINDOWSIZECHANGED):
+        presenter.resize()
+        ui.invalidate()
+        renderer.invalidate()
+    if event.type == KEYDOWN:
+        if current_state != STATE_PLAYING:
+            renderer.invalidate()
+        if event.key == K_ESCAPE:
+            return False
+        if event.key == K_F3:
+            perf.toggle()
+            renderer.invalidate()
+        if event.key == K_F4:
+            perf.start_profile()
+        if event.key == K_F6:
+            quick_slot = quick_slot % SLOTS + 1
+            if current_state == STATE_PLAYING:
+                sim.dialog = f"Quick-save slot {quick_slot} selected."
+        if event.key == K_F9:
+            quick_load()
+            return True
+        if current_state == STATE_TITLE:
+            if event.key == K_RETURN:
+                set_state(STATE_PROLOGUE)
+        elif current_state == STATE_PROLOGUE:
+            if event.key == K_RETURN:
+                prologue_index += 1
+                if prologue_index >= len(prologue_texts):
+                    set_state(STATE_PLAYING)
+                    prologue_index = 0
+        elif current_state == STATE_PLAYING:
+            if event.key == K_e:
+                handle_interaction()
+            if event.key == K_q:
+                sim.step(('close',))
+            if event.key == K_i:
+                sim.step(('inventory',))
+            if event.key == K_F5:
+                quick_save()
+            if sim.choice is not None:
+                if event.key == K_UP:
+                    selected_choice = (selected_choice - 1) % len(sim.options())
+                if event.key == K_DOWN:
+                    selected_choice = (selected_choice + 1) % len(sim.options())
                 if event.key == K_RETURN:
-                    prologue_index += 1
-                    if prologue_index >= len(prologue_texts):
-                        current_state = STATE_PLAYING
-                        prologue_index = 0
-            elif current_state == STATE_PLAYING:
-                if event.key == K_e:
-                    if not game_over and not show_inventory:
-                        collided = pygame.sprite.spritecollide(player, interactables, False)
-                        if collided:
-                            handle_interaction(collided[0])
-                if event.key == K_q:
-                    if current_dialog:
-                        current_dialog = ""
-                        show_choice = False
-                if event.key == K_i:
-                    show_inventory = not show_inventory
-                if show_choice:
-                    if event.key == K_UP:
-                        selected_choice = (selected_choice - 1) % len(choices)
-                    if event.key == K_DOWN:
-                        selected_choice = (selected_choice + 1) % len(choices)
-                    if event.key == K_RETURN:
-                        handle_choice(selected_choice)
-            elif current_state in (STATE_GAME_OVER, STATE_GAME_COMPLETE):
-                if event.key == K_r:
-                    reset_game()
-                if event.key == K_ESCAPE:
-                    running = False
-
+                    handle_choice(selected_choice)
+        elif current_state in (STATE_GAME_OVER, STATE_GAME_COMPLETE):
+            if event.key == K_r:
+                reset_game()
+    return True
+
+# One fixed simulation tick
+def update_world(keys):
+    global player_prev
     if current_state == STATE_PLAYING:
-        keys = pygame.key.get_pressed()
-        player.update(keys, collidables)
-
-    # Drawing
+        player_prev = (sim.x, sim.y)
+        sim.tick(keys[K_d] - keys[K_a], keys[K_s] - keys[K_w])
+
+# Places the player between the last two ticks and streams the world around it
+def prepare_frame(alpha):
+    global player_view
+    x = lerp(player_prev[0], sim.x, alpha)
+    y = lerp(player_prev[1], sim.y, alpha)
+    player_view = pygame.Rect((round(x), round(y)), sim.world.player_size)
+    offset_x, offset_y = get_camera_offset(player_view)
+    if world_layer.update(pygame.Rect(-offset_x, -offset_y, SCREEN_WIDTH, SCREEN_HEIGHT)):
+        renderer.invalidate()
+    mark_playing_dirty((offset_x, offset_y))
+
+def draw_world(offset, clip):
+    if world_layer.dirty:
+        world_layer.prepare(build_world)
+    offset_x, offset_y = offset
+    visible = clip.move(-offset_x, -offset_y)
+    chunks = world_layer.commands(offset, visible)
+    render_queue.extend(LAYER_WORLD, chunks)
+    # Sprites are y-sorted: whatever stands lower on screen is drawn in front
+    render_queue.add(LAYER_SPRITES, images[PLAYER_KEY], (player_view.x + offset_x, player_view.y + offset_y),
+                     z=player_view.bottom)
+    sprites = sim.world.interactables.query(visible)
+    for sprite in sprites:
+        rect = sprite.rect
+        render_queue.add(LAYER_SPRITES, images[sprite.image_key], (rect.x + offset_x, rect.y + offset_y),
+                         z=rect.y + rect.h)
+    perf.count('blits', len(chunks) + len(sprites) + 1)
+
+def draw_choices():
+    for i, ch in enumerate(sim.options()):
+        color = (255, 255, 0) if i == selected_choice else (255, 255, 255)
+        text = render_text(font, ch, color)
+        render_queue.add(LAYER_CHOICES, text, (10, 500 + i * 40))
+
+# Draws whatever changed since the last frame; returns True if anything did.
+# alpha is how far rendering is between the last simulation tick and the next
+def draw_frame(alpha=1.0):
+    global perf_refreshed
+    if current_state == STATE_PLAYING:
+        prepare_frame(alpha)
+    if perf.enabled and pygame.time.get_ticks() - perf_refreshed >= PERF_REFRESH_MS:
+        perf_refreshed = pygame.time.get_ticks()
+        renderer.invalidate(PERF_RECT)
+    if not renderer.dirty:
+        return False
+    clip = renderer.clip_rect()
+    screen.set_clip(clip)
     screen.fill((0, 0, 0))
     if current_state == STATE_TITLE:
         draw_title()
     elif current_state == STATE_PROLOGUE:
         draw_prologue(prologue_index)
     elif current_state == STATE_PLAYING:
-        # Draw game world
-        offset_x, offset_y = get_camera_offset(player.rect)
-        screen.blit(images['background/background.png'], (offset_x, offset_y))
-        for sprite in all_sprites:
-            screen.blit(sprite.image, (sprite.rect.x + offset_x, sprite.rect.y + offset_y))
-        if current_dialog:
-            draw_dialog(current_dialog, current_npc_img)
-        if show_choice:
-            for i, ch in enumerate(choices):
-                color = (255, 255, 0) if i == selected_choice else (255, 255, 255)
-                text = font.render(ch, True, color)
-                screen.blit(text, (10, 500 + i * 40))
-        if show_inventory:
-            draw_inventory()
+        with perf.section('world'):
+            draw_world(get_camera_offset(player_view), clip)
+        if sim.dialog:
+            with perf.section('dialog'):
+                draw_dialog(sim.dialog, npc_images.get(sim.speaker))
+        if sim.choice is not None:
+            draw_choices()
+        if sim.show_inventory:
+            with perf.section('inventory'):
+                draw_inventory()
         draw_indicators()
     elif current_state == STATE_GAME_OVER:
         draw_game_over()
     elif current_state == STATE_GAME_COMPLETE:
         draw_game_complete()
-
-    pygame.display.flip()
-    clock.tick(60)
-
-pygame.quit()
-sys.exit()
\ No newline at end of file
+    if perf.enabled:
+        draw_perf_overlay()
+    # The draw functions only queue; the blitting itself happens here
+    with perf.section('blit'):
+        render_queue.flush(screen)
+    screen.set_clip(None)
+    with perf.section('present'):
+        renderer.present()
+    return True
+
+# Stops the background loaders before pygame goes away
+def shutdown():
+    images.close()
+    world_layer.close()
+    pygame.quit()
+
+# Main game loop; pass --load PATH to start from a saved snapshot
+def main(argv=()):
+    if '--load' in argv:
+        index = argv.index('--load') + 1
+        if index >= len(argv):
+            print("usage: main.py [--load PATH]", file=sys.stderr)
+            shutdown()
+            sys.exit(2)
+        try:
+            load_game(argv[index])
+        except (OSError, ValueError) as e:
+            print(f"could not load {argv[index]}: {e}", file=sys.stderr)
+            shutdown()
+            sys.exit(1)
+    running = True
+    accumulator = 0.0
+    frame_time = 0.0
+    while running:
+        events = clock.events()
+        perf.begin_frame()
+        with perf.section('events'):
+            for event in events:
+                running = handle_event(event) and running
+
+        with perf.section('update'):
+            keys = pygame.key.get_pressed()
+            accumulator += min(frame_time, MAX_FRAME_TIME)
+            while accumulator >= SIM_STEP:
+                update_world(keys)
+                accumulator -= SIM_STEP
+        drew = draw_frame(accumulator / SIM_STEP)
+        perf.end_frame()
+
+        # Sleep until the next event when nothing moved or changed. Profiling
+        # and the perf overlay keep the loop awake, so a profile covers real
+        # frames rather than idle waits and the overlay refreshes on time
+        busy = drew or perf.enabled or perf.profiling or (current_state == STATE_PLAYING and movement_held())
+        frame_time = clock.tick(busy) / 1000
+
+    shutdown()
+    sys.exit()
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,124 @@
+# Performance instrumentation
+# Times the phases of the main loop over a rolling window, counts per-frame
+# events such as blits, and can capture a cProfile of the next N frames.
+# Sections cost two perf_counter calls while the monitor is enabled and next
+# to nothing while it is not.
+import cProfile
+import os
+import time
+from collections import deque
+
+WINDOW = 120
+PROFILE_FRAMES = 300
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+
+
+class _Section:
+    __slots__ = ('monitor', 'name', 'start')
+
+    def __init__(self, monitor, name):
+        self.monitor = monitor
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.monitor.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullSection:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SECTION = _NullSection()
+
+
+class PerfMonitor:
+    def __init__(self, window=WINDOW):
+        self.enabled = False
+        self.window = window
+        self.timings = {}
+        self.counters = {}
+        self.frame_times = deque(maxlen=window)
+        self._frame_counts = {}
+        self._frame_start = None
+        self._profile = None
+        self._profile_left = 0
+        self.last_profile = None
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        return self.enabled
+
+    def section(self, name):
+        if not self.enabled:
+            return _NULL_SECTION
+        return _Section(self, name)
+
+    def add(self, name, seconds):
+        samples = self.timings.get(name)
+        if samples is None:
+            samples = self.timings[name] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self._frame_counts[name] = self._frame_counts.get(name, 0) + n
+
+    def begin_frame(self):
+        if self.enabled:
+            self._frame_start = time.perf_counter()
+            self._frame_counts = {}
+
+    def end_frame(self):
+        if self.enabled and self._frame_start is not None:
+            self.frame_times.append(time.perf_counter() - self._frame_start)
+            for name, n in self._frame_counts.items():
+                counts = self.counters.get(name)
+                if counts is None:
+                    counts = self.counters[name] = deque(maxlen=self.window)
+                counts.append(n)
+        if self._profile is not None:
+            self._profile_left -= 1
+            if self._profile_left <= 0:
+                self._finish_profile()
+
+    def mean_ms(self, name):
+        samples = self.timings.get(name)
+        return sum(samples) * 1000 / len(samples) if samples else 0.0
+
+    def mean_count(self, name):
+        counts = self.counters.get(name)
+        return sum(counts) / len(counts) if counts else 0.0
+
+    def frame_ms(self):
+        if not self.frame_times:
+            return 0.0
+        return sum(self.frame_times) * 1000 / len(self.frame_times)
+
+    # Profiling
+
+    @property
+    def profiling(self):
+        return self._profile is not None
+
+    def start_profile(self, frames=PROFILE_FRAMES):
+        if self._profile is None:
+            self._profile = cProfile.Profile()
+            self._profile_left = frames
+            self._profile.enable()
+
+    def _finish_profile(self):
+        self._profile.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, time.strftime('frames-%Y%m%d-%H%M%S.prof'))
+        self._profile.dump_stats(path)
+        self._profile = None
+        self.last_profile = path
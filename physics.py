@@ -0,0 +1,59 @@
+# Movement and collision
+# Swept AABB against static obstacles: a box moves along x and then along y,
+# and stops flush against the first obstacle in its path however far it moves
+# in one step, so fast movement or long frames can't tunnel through walls.
+# Obstacles only need a rect exposing x, y, w and h. Nothing here depends on
+# pygame, so the headless simulation shares it with the game.
+
+
+class Box:
+    __slots__ = ('x', 'y', 'w', 'h')
+
+    def __init__(self, x, y, w, h):
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+
+
+def sweep(box, dx, dy, obstacles):
+    # box is (x, y, w, h); returns the new (x, y)
+    x, y, w, h = box
+    if dx:
+        for ob in obstacles:
+            if y < ob.y + ob.h and ob.y < y + h:
+                if dx > 0 and x + w <= ob.x:
+                    dx = min(dx, ob.x - (x + w))
+                elif dx < 0 and ob.x + ob.w <= x:
+                    dx = max(dx, ob.x + ob.w - x)
+        x += dx
+    if dy:
+        for ob in obstacles:
+            if x < ob.x + ob.w and ob.x < x + w:
+                if dy > 0 and y + h <= ob.y:
+                    dy = min(dy, ob.y - (y + h))
+                elif dy < 0 and ob.y + ob.h <= y:
+                    dy = max(dy, ob.y + ob.h - y)
+        y += dy
+    return x, y
+
+
+def swept_bounds(box, dx, dy):
+    # Integer (x, y, w, h) covering the box over the whole move
+    x, y, w, h = box
+    left, top = int(min(x, x + dx)) - 1, int(min(y, y + dy)) - 1
+    right, bottom = int(max(x, x + dx) + w) + 2, int(max(y, y + dy) + h) + 2
+    return left, top, right - left, bottom - top
+
+
+def move(box, dx, dy, obstacles, bounds):
+    # Moves box through a spatial index of obstacles and keeps it inside
+    # bounds (width, height); returns the new (x, y)
+    nearby = obstacles.query(Box(*swept_bounds(box, dx, dy)))
+    x, y = sweep(box, dx, dy, [ob.rect for ob in nearby])
+    w, h = box[2], box[3]
+    return max(0, min(x, bounds[0] - w)), max(0, min(y, bounds[1] - h))
+
+
+def lerp(a, b, t):
+    return a + (b - a) * t
@@ -0,0 +1,137 @@
+# Presentation
+# The game draws into a back-buffer of a fixed logical size and the presenter
+# shows it in a resizable window of any size, scaled to fit and letterboxed.
+#
+# With SDL's renderer (pygame._sdl2) the back-buffer is uploaded to a texture,
+# only the dirty regions of it, and the GPU does the scaling; presents wait for
+# vsync, so the frame rate follows the display. There is then no
+# display surface, so to_display() converts surfaces to the back-buffer's
+# format rather than with convert() and convert_alpha(). Without the renderer,
+# or with accelerated=False, the back-buffer is copied onto the window surface
+# when the window has the logical size and scaled in software when it doesn't.
+import pygame
+
+try:
+    from pygame._sdl2.video import Renderer, Texture, Window
+except ImportError:
+    Renderer = Texture = Window = None
+
+LOGICAL_SIZE = (1280, 720)
+
+# Formats surfaces are converted to when there is no display surface
+_formats = {}
+
+
+def display_ready():
+    return pygame.display.get_surface() is not None or bool(_formats)
+
+
+def to_display(surface, alpha=False):
+    # Converts a surface to the format that blits fastest onto the screen;
+    # returns it unchanged while there is nothing to draw on yet
+    if pygame.display.get_surface() is not None:
+        return surface.convert_alpha() if alpha else surface.convert()
+    template = _formats.get(alpha)
+    return surface.convert(template) if template is not None else surface
+
+
+def fit(size, window_size):
+    # The largest rect with size's aspect ratio centred in window_size
+    scale = min(window_size[0] / size[0], window_size[1] / size[1])
+    w, h = round(size[0] * scale), round(size[1] * scale)
+    return pygame.Rect((window_size[0] - w) // 2, (window_size[1] - h) // 2, w, h)
+
+
+class Presenter:
+    def __init__(self, size=LOGICAL_SIZE, window_size=None, title='', accelerated=True, vsync=True):
+        self.size = size
+        self.window = None
+        self.renderer = None
+        self.texture = None
+        self.vsync = False
+        if accelerated and Renderer is not None:
+            try:
+                self._open_renderer(window_size or size, title, vsync)
+            except pygame.error:
+                # Close the window before set_mode opens another one
+                if self.window is not None:
+                    self.window.destroy()
+                self.window = self.renderer = self.texture = None
+                self.vsync = False
+        if self.renderer is None:
+            pygame.display.set_mode(window_size or size, pygame.RESIZABLE)
+            pygame.display.set_caption(title)
+            self.surface = pygame.Surface(size).convert()
+            self.resize()
+
+    @property
+    def accelerated(self):
+        return self.renderer is not None
+
+    def _open_renderer(self, window_size, title, vsync):
+        self.window = Window(title, size=window_size, resizable=True)
+        self.renderer = Renderer(self.window, vsync=vsync)
+        # SDL scales the logical size to the window and letterboxes it
+        self.renderer.logical_size = self.size
+        self.surface = pygame.Surface(self.size)
+        self.texture = Texture.from_surface(self.renderer, self.surface)
+        self.renderer.draw_color = (0, 0, 0, 255)
+        _formats[False] = self.surface
+        _formats[True] = pygame.Surface((1, 1), pygame.SRCALPHA, 32)
+        self.vsync = vsync
+
+    def resize(self):
+        # Call when the window size changes; the next present is a full one
+        if self.renderer is None:
+            window = pygame.display.get_surface()
+            window.fill((0, 0, 0))
+            self.view = fit(self.size, window.get_size())
+
+    @property
+    def integer_scale(self):
+        scale, rest = divmod(self.view.w, self.size[0])
+        return not rest and self.view.h == self.size[1] * scale
+
+    def window_rect(self, rect):
+        # Maps a back-buffer rect to the window, covering partial pixels
+        scale_x, scale_y = self.view.w / self.size[0], self.view.h / self.size[1]
+        left, top = int(rect.x * scale_x), int(rect.y * scale_y)
+        right, bottom = -int(-rect.right * scale_x), -int(-rect.bottom * scale_y)
+        return pygame.Rect(self.view.x + left, self.view.y + top, right - left, bottom - top)
+
+    def present(self, rects=None):
+        # rects are the back-buffer regions that changed; None means all of it
+        if self.renderer is not None:
+            if rects is None:
+                self.texture.update(self.surface)
+            else:
+                for rect in rects:
+                    self.texture.update(self.surface.subsurface(rect), rect)
+            self.renderer.clear()
+            self.texture.draw()
+            self.renderer.present()
+            return
+        window = pygame.display.get_surface()
+        if self.view.size == self.size:
+            if rects is None:
+                window.blit(self.surface, self.view)
+                pygame.display.flip()
+            else:
+                window.blits([(self.surface, rect.move(self.view.topleft), rect) for rect in rects],
+                             doreturn=False)
+                pygame.display.update([rect.move(self.view.topleft) for rect in rects])
+            return
+        # Scaled in software. At a whole-number scale, such as 1280x720 on a
+        # 4K display, each changed region scales to exact window pixels on its
+        # own; otherwise the whole view is rescaled so no seams show
+        if rects is not None and self.integer_scale:
+            targets = [self.window_rect(rect) for rect in rects]
+            for rect, target in zip(rects, targets):
+                pygame.transform.scale(self.surface.subsurface(rect), target.size, window.subsurface(target))
+            pygame.display.update(targets)
+            return
+        pygame.transform.scale(self.surface, self.view.size, window.subsurface(self.view))
+        if rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update([self.window_rect(rect) for rect in rects])
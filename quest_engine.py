@@ -0,0 +1,203 @@
+# Data-driven quest engine
+# Quests are described in a JSON file as nodes (quest stages), interaction
+# rules and choice menus. Loading compiles them into a transition table keyed
+# by (object name, node), so an interaction is one dict lookup followed by the
+# few rules written for that object in that stage, however large the story.
+#
+# Rule fields, all optional:
+#   if      conditions, e.g. {"met_all": "npcs", "has": "item", "lacks": "item"}
+#   speaker show the interacted object's portrait next to the dialog
+#   meet    remember that the object was talked to
+#   give    / take  add or remove an inventory item
+#   dialog  text to show; "append" adds conditional text after the effects
+#   choice  open the named choice menu instead
+#   goto    move the quest to another node
+#   ending  "game_over" or "game_complete", with "message" for the end screen
+# A node is {"rules": {target: [rule, ...]}, "defaults": {target: fields}},
+# where a target is an object name or "@group" for every member of a group.
+# An object's rules are tried in order: those written for it, those for its
+# groups, then the same from the "*" node, which applies in every node.
+# Defaults fill in the fields a node's rules for that target leave out, so
+# text shared by several objects is written once. Nodes with "final": true
+# ignore all interactions.
+import json
+from collections import namedtuple
+
+WILDCARD = '*'
+GROUP = '@'
+NODE_FIELDS = {'rules', 'defaults', 'final'}
+RULE_FIELDS = {'if', 'speaker', 'meet', 'give', 'take', 'dialog', 'append', 'choice', 'goto', 'ending', 'message'}
+OPTION_FIELDS = RULE_FIELDS | {'text'}
+APPEND_FIELDS = {'if', 'text'}
+ENDINGS = ('game_over', 'game_complete')
+
+Outcome = namedtuple('Outcome', 'dialog speaker choice ending message')
+Choice = namedtuple('Choice', 'name prompt texts options')
+
+
+def _check_fields(spec, fields, what):
+    for field in set(spec) - fields:
+        raise ValueError(f"unknown field in {what}: {field}")
+
+
+def _is_group(item):
+    return item[0].startswith(GROUP)
+
+
+class QuestState:
+    __slots__ = ('node', 'met', 'inventory')
+
+    def __init__(self, node):
+        self.node = node
+        self.met = set()
+        self.inventory = []
+
+
+class Rule:
+    __slots__ = ('conditions', 'speaker', 'meet', 'give', 'take', 'dialog',
+                 'append', 'choice', 'goto', 'ending', 'message')
+
+    def __init__(self, spec, compile_conditions, fields=RULE_FIELDS, what='quest rule'):
+        _check_fields(spec, fields, what)
+        for extra in spec.get('append', ()):
+            _check_fields(extra, APPEND_FIELDS, what + ' append')
+        self.conditions = compile_conditions(spec.get('if', {}))
+        self.speaker = spec.get('speaker', False)
+        self.meet = spec.get('meet', False)
+        self.give = spec.get('give')
+        self.take = spec.get('take')
+        self.dialog = spec.get('dialog', '')
+        self.append = tuple(
+            (compile_conditions(extra.get('if', {})), extra['text'])
+            for extra in spec.get('append', ())
+        )
+        self.choice = spec.get('choice')
+        self.goto = spec.get('goto')
+        self.ending = spec.get('ending')
+        self.message = spec.get('message', '')
+
+    def matches(self, state):
+        return all(check(state) for check in self.conditions)
+
+
+class QuestEngine:
+    def __init__(self, data):
+        self.start = data['start']
+        self.default = data.get('default', '')
+        self.groups = {name: frozenset(members) for name, members in data.get('groups', {}).items()}
+        self.nodes = set(data['nodes']) - {WILDCARD}
+        for name, node in data['nodes'].items():
+            _check_fields(node, NODE_FIELDS, f"quest node {name}")
+        self.final = {name for name, node in data['nodes'].items() if node.get('final')}
+        self.choices = {}
+        for name, spec in data.get('choices', {}).items():
+            options = tuple(Rule(option, self._conditions, OPTION_FIELDS, 'quest choice option') for option in spec['options'])
+            texts = tuple(option['text'] for option in spec['options'])
+            self.choices[name] = Choice(name, spec['prompt'], texts, options)
+
+        # (object name, node) -> rules, node rules first, then wildcard rules
+        self.table = {}
+        wildcard = self._compile_node(data['nodes'].get(WILDCARD, {}))
+        for node in self.nodes:
+            if node in self.final:
+                continue
+            rules = self._compile_node(data['nodes'][node])
+            for name in set(rules) | set(wildcard):
+                self.table[(name, node)] = rules.get(name, ()) + wildcard.get(name, ())
+        self._validate()
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def _targets(self, target):
+        if not target.startswith(GROUP):
+            return (target,)
+        group = self.groups.get(target[len(GROUP):])
+        if group is None:
+            raise ValueError(f"unknown quest group: {target}")
+        return sorted(group)
+
+    def _compile_node(self, node):
+        # object name -> rules. Group defaults are merged first so an
+        # object's own defaults override them; an object's own rules are
+        # compiled first so they are tried before its groups'
+        defaults = {}
+        for target, fields in sorted(node.get('defaults', {}).items(), key=lambda item: not _is_group(item)):
+            _check_fields(fields, RULE_FIELDS, 'quest defaults')
+            for name in self._targets(target):
+                defaults[name] = {**defaults.get(name, {}), **fields}
+        rules = {}
+        for target, specs in sorted(node.get('rules', {}).items(), key=_is_group):
+            for name in self._targets(target):
+                rules.setdefault(name, []).extend(
+                    Rule({**defaults.get(name, {}), **spec}, self._conditions) for spec in specs)
+        return {name: tuple(compiled) for name, compiled in rules.items()}
+
+    def _conditions(self, spec):
+        checks = []
+        for kind, arg in spec.items():
+            if kind == 'met_all':
+                group = self.groups.get(arg)
+                if group is None:
+                    raise ValueError(f"unknown quest group: {arg}")
+                checks.append(lambda state, group=group: group <= state.met)
+            elif kind == 'has':
+                checks.append(lambda state, item=arg: item in state.inventory)
+            elif kind == 'lacks':
+                checks.append(lambda state, item=arg: item not in state.inventory)
+            else:
+                raise ValueError(f"unknown quest condition: {kind}")
+        return tuple(checks)
+
+    def _validate(self):
+        rules = [rule for compiled in self.table.values() for rule in compiled]
+        rules += [option for choice in self.choices.values() for option in choice.options]
+        if self.start not in self.nodes:
+            raise ValueError(f"unknown start node: {self.start}")
+        for rule in rules:
+            if rule.goto is not None and rule.goto not in self.nodes:
+                raise ValueError(f"unknown quest node: {rule.goto}")
+            if rule.choice is not None and rule.choice not in self.choices:
+                raise ValueError(f"unknown quest choice: {rule.choice}")
+            if rule.ending is not None and rule.ending not in ENDINGS:
+                raise ValueError(f"unknown quest ending: {rule.ending}")
+
+    def new_state(self):
+        return QuestState(self.start)
+
+    def is_final(self, state):
+        return state.node in self.final
+
+    def interact(self, state, name):
+        # Returns the Outcome of interacting with an object, or None when the
+        # quest has already ended
+        if state.node in self.final:
+            return None
+        for rule in self.table.get((name, state.node), ()):
+            if rule.matches(state):
+                return self._apply(state, rule, name)
+        return Outcome(self.default, None, None, None, '')
+
+    def choose(self, state, choice, index):
+        return self._apply(state, self.choices[choice].options[index], None)
+
+    def _apply(self, state, rule, name):
+        if rule.meet:
+            state.met.add(name)
+        if rule.take is not None and rule.take in state.inventory:
+            state.inventory.remove(rule.take)
+        if rule.give is not None and rule.give not in state.inventory:
+            state.inventory.append(rule.give)
+        if rule.goto is not None:
+            state.node = rule.goto
+        if rule.choice is not None:
+            dialog = self.choices[rule.choice].prompt
+        else:
+            dialog = rule.dialog
+            for conditions, text in rule.append:
+                if all(check(state) for check in conditions):
+                    dialog += text
+        speaker = name if rule.speaker else None
+        return Outcome(dialog, speaker, rule.choice, rule.ending, rule.message)
@@ -0,0 +1,40 @@
+# Render queue
+# Draw calls are collected per layer as (surface, dest, area) commands and
+# submitted with a single Surface.blits call per layer, lowest layer first,
+# instead of one interpreted blit() call per sprite. Within a layer commands
+# are ordered by z and keep submission order when z is equal, so world sprites
+# queued with their bottom edge as z are drawn back to front.
+from operator import itemgetter
+
+_z = itemgetter(0)
+
+
+class RenderQueue:
+    def __init__(self):
+        self.layers = {}
+
+    def _layer(self, layer):
+        commands = self.layers.get(layer)
+        if commands is None:
+            commands = self.layers[layer] = []
+        return commands
+
+    def add(self, layer, surface, dest, area=None, z=0):
+        command = (surface, dest) if area is None else (surface, dest, area)
+        self._layer(layer).append((z, command))
+
+    def extend(self, layer, commands, z=0):
+        # commands are (surface, dest) or (surface, dest, area) tuples
+        self._layer(layer).extend((z, command) for command in commands)
+
+    def flush(self, target):
+        # Draws every layer onto target and empties the queue; returns the
+        # number of blits submitted
+        count = 0
+        for layer in sorted(self.layers):
+            commands = self.layers[layer]
+            commands.sort(key=_z)
+            target.blits([command for _, command in commands], doreturn=False)
+            count += len(commands)
+        self.layers.clear()
+        return count
@@ -0,0 +1,43 @@
+# Adaptive frame scheduler
+# While something is happening the loop runs at a fixed rate, or with fps=0
+# as fast as presenting allows, which is the refresh rate when presents wait
+# for vsync. When a frame had nothing to draw and no movement keys are held,
+# the next frame blocks on pygame.event.wait instead, so an idle game sleeps
+# until input arrives.
+import pygame
+
+DEFAULT_FPS = 60
+IDLE_TIMEOUT_MS = 500
+
+
+class AdaptiveClock:
+    def __init__(self, fps=DEFAULT_FPS, idle_timeout=IDLE_TIMEOUT_MS):
+        self.fps = fps
+        self.idle_timeout = idle_timeout
+        self.clock = pygame.time.Clock()
+        self.idle = False
+        self.slept = 0
+
+    def events(self):
+        # Blocks for the first event while idle, then drains the queue
+        if not self.idle:
+            return pygame.event.get()
+        start = pygame.time.get_ticks()
+        first = pygame.event.wait(self.idle_timeout)
+        # Don't let the time spent asleep count as one long frame
+        self.slept += pygame.time.get_ticks() - start
+        events = pygame.event.get()
+        if first.type != pygame.NOEVENT:
+            events.insert(0, first)
+        return events
+
+    def tick(self, busy):
+        # Every frame ticks the clock, so get_fps() stays current while idle;
+        # returns the frame's time for the simulation, less any sleep
+        self.idle = not busy
+        elapsed = self.clock.tick(self.fps if busy else 0)
+        slept, self.slept = self.slept, 0
+        return max(0, elapsed - slept) if busy else 0
+
+    def get_fps(self):
+        return self.clock.get_fps()
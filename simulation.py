@@ -0,0 +1,324 @@
+# Headless simulation
+# The game's rules without a window: movement and collision, interactions,
+# choices and endings, driven one action at a time through step(). main.py
+# plays through one Simulation and only adds screens, input and drawing on
+# top. Nothing here imports pygame, so any number of games can run side by
+# side in one process, or across a process pool for batch playthroughs.
+#
+# Actions are tuples:
+#   ('move', dx, dy[, ticks])  hold a direction (-1, 0 or 1 per axis)
+#   ('interact',)              press E where the player stands
+#   ('interact', name)         walk up to a named object and press E
+#   ('choose', index)          pick an option from the open choice menu
+#   ('close',)                 press Q to dismiss the dialog
+#   ('inventory',)             press I
+#
+#   python simulation.py [--runs N] [--workers N] [--steps N] [--explore]
+#
+# --explore also replays EXPECTED_ENDINGS and exits with status 1 when an
+# ending can't be reached or a scripted playthrough no longer ends where it
+# should, so edits to quests.json can be checked before playing.
+import os
+import random
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from image_sizes import IMAGE_SIZES
+from object_positions import OBJECT_POSITIONS
+from physics import Box, move
+from quest_engine import ENDINGS, QuestEngine, QuestState
+from spatial_grid import SpatialGrid
+
+QUEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'quests.json')
+WORLD_KEY = 'background/background.png'
+PLAYER_KEY = 'main character/detective.png'
+PLAYER_SPEED = 300  # Pixels per second
+PLAYER_START = (800, 600)  # Centre of the player
+SIM_RATE = 60
+SIM_STEP = 1.0 / SIM_RATE
+
+RANDOM_STEPS = 200
+
+# The intended way to each ending
+_GATHER = (('interact', 'quest'), ('interact', 'npc1'), ('interact', 'npc2'), ('interact', 'good'),
+           ('interact', 'bad'), ('interact', 'telephone'), ('choose', 1), ('interact', 'bad'),
+           ('interact', 'table'))
+EXPECTED_ENDINGS = {
+    'game_over': _GATHER + (('choose', 0),),
+    'game_complete': _GATHER + (('choose', 1), ('interact', 'mayor'), ('choose', 1)),
+}
+
+
+class WorldObject:
+    __slots__ = ('name', 'image_key', 'rect', 'interactable', 'collidable')
+
+    def __init__(self, name, image_key, rect, interactable, collidable):
+        self.name = name
+        self.image_key = image_key
+        self.rect = rect
+        self.interactable = interactable
+        self.collidable = collidable
+
+
+class World:
+    # Everything that never changes during a game, shared by all instances
+    def __init__(self, engine):
+        self.engine = engine
+        self.bounds = IMAGE_SIZES[WORLD_KEY]
+        self.player_size = IMAGE_SIZES[PLAYER_KEY]
+        self.objects = {}
+        self.interactables = SpatialGrid()
+        self.collidables = SpatialGrid()
+        for name, (image_key, pos, interactable, collidable) in OBJECT_POSITIONS.items():
+            obj = WorldObject(name, image_key, Box(*pos, *IMAGE_SIZES[image_key]), interactable, collidable)
+            self.objects[name] = obj
+            if interactable:
+                self.interactables.insert(obj)
+            if collidable:
+                self.collidables.insert(obj)
+        self.interactable_names = tuple(obj.name for obj in self.interactables)
+
+
+_default_world = None
+
+
+def default_world():
+    global _default_world
+    if _default_world is None:
+        _default_world = World(QuestEngine.load(QUEST_PATH))
+    return _default_world
+
+
+class Simulation:
+    __slots__ = ('world', 'quest', 'x', 'y', 'dialog', 'speaker', 'choice',
+                 'show_inventory', 'ending', 'message', 'ticks')
+
+    def __init__(self, world=None):
+        self.world = world or default_world()
+        self.reset()
+
+    def reset(self):
+        w, h = self.world.player_size
+        self.quest = self.world.engine.new_state()
+        self.x = PLAYER_START[0] - w // 2
+        self.y = PLAYER_START[1] - h // 2
+        self.dialog = ''
+        self.speaker = None
+        self.choice = None
+        self.show_inventory = False
+        self.ending = None
+        self.message = ''
+        self.ticks = 0
+
+    def copy(self):
+        sim = Simulation.__new__(Simulation)
+        for name in Simulation.__slots__:
+            setattr(sim, name, getattr(self, name))
+        sim.quest = QuestState(self.quest.node)
+        sim.quest.met = set(self.quest.met)
+        sim.quest.inventory = list(self.quest.inventory)
+        return sim
+
+    @property
+    def done(self):
+        return self.ending is not None
+
+    @property
+    def player_rect(self):
+        w, h = self.world.player_size
+        return Box(round(self.x), round(self.y), w, h)
+
+    def key(self):
+        # Identifies the quest-relevant state, ignoring where the player is
+        return (self.quest.node, frozenset(self.quest.met), tuple(self.quest.inventory), self.choice)
+
+    def step(self, action):
+        # Applies one action; returns the quest Outcome it produced, if any
+        kind = action[0]
+        if kind == 'move':
+            for _ in range(action[3] if len(action) > 3 else 1):
+                self.tick(action[1], action[2])
+        elif kind == 'interact':
+            if len(action) > 1:
+                self.walk_to(action[1])
+            return self.interact()
+        elif kind == 'choose':
+            return self.choose(action[1])
+        elif kind == 'close':
+            if self.dialog:
+                self.dialog = ''
+                self.choice = None
+        elif kind == 'inventory':
+            self.show_inventory = not self.show_inventory
+        else:
+            raise ValueError(f"unknown action: {kind}")
+        return None
+
+    def tick(self, dx, dy):
+        self.ticks += 1
+        if self.ending is None and (dx or dy):
+            w, h = self.world.player_size
+            distance = PLAYER_SPEED * SIM_STEP
+            self.x, self.y = move((self.x, self.y, w, h), dx * distance, dy * distance,
+                                  self.world.collidables, self.world.bounds)
+
+    def walk_to(self, name):
+        # Stands the player on the object's centre; only objects the player
+        # can overlap (interactables) are reachable this way
+        obj = self.world.objects.get(name)
+        if obj is None:
+            raise ValueError(f"unknown object: {name}")
+        w, h = self.world.player_size
+        self.x = obj.rect.x + (obj.rect.w - w) // 2
+        self.y = obj.rect.y + (obj.rect.h - h) // 2
+
+    def interact(self):
+        if self.ending is not None or self.show_inventory or self.world.engine.is_final(self.quest):
+            return None
+        collided = self.world.interactables.query(self.player_rect)
+        if not collided:
+            return None
+        outcome = self.world.engine.interact(self.quest, collided[0].name)
+        if outcome is not None:
+            self._apply(outcome)
+        return outcome
+
+    def choose(self, index):
+        if self.choice is None or self.world.engine.is_final(self.quest):
+            return None
+        if index not in range(len(self.options())):
+            raise ValueError(f"no option {index} in choice menu {self.choice}")
+        outcome = self.world.engine.choose(self.quest, self.choice, index)
+        self._apply(outcome)
+        return outcome
+
+    def options(self):
+        if self.choice is None:
+            return ()
+        return self.world.engine.choices[self.choice].texts
+
+    def _apply(self, outcome):
+        self.dialog = outcome.dialog
+        self.speaker = outcome.speaker
+        self.choice = outcome.choice
+        if outcome.ending:
+            self.ending = outcome.ending
+            self.message = outcome.message
+
+
+# Batch playthroughs
+
+def random_action(sim, rng):
+    if sim.choice is not None and rng.random() < 0.5:
+        return ('choose', rng.randrange(len(sim.options())))
+    roll = rng.random()
+    if roll < 0.05:
+        return ('move', rng.choice((-1, 0, 1)), rng.choice((-1, 0, 1)), rng.randint(1, 10))
+    if roll < 0.1:
+        return ('close',)
+    return ('interact', rng.choice(sim.world.interactable_names))
+
+
+def play_random(seed, steps=RANDOM_STEPS, world=None):
+    # One randomized playthrough; returns (ending or None, actions taken)
+    rng = random.Random(seed)
+    sim = Simulation(world)
+    for n in range(steps):
+        sim.step(random_action(sim, rng))
+        if sim.done:
+            return sim.ending, n + 1
+    return None, steps
+
+
+def _play_batch(args):
+    first, count, steps = args
+    endings = Counter()
+    for seed in range(first, first + count):
+        endings[play_random(seed, steps)[0]] += 1
+    return endings
+
+
+def run_batch(runs, workers=None, steps=RANDOM_STEPS, seed=0):
+    # Counts endings over randomized playthroughs; workers=0 runs in-process
+    if workers == 0:
+        return _play_batch((seed, runs, steps))
+    workers = workers or os.cpu_count() or 1
+    size = max(1, -(-runs // (workers * 4)))
+    jobs = [(seed + first, min(size, runs - first), steps) for first in range(0, runs, size)]
+    endings = Counter()
+    with ProcessPoolExecutor(workers) as pool:
+        for counts in pool.map(_play_batch, jobs):
+            endings.update(counts)
+    return endings
+
+
+def explore(world=None):
+    # Breadth-first search over every distinct quest state reachable by
+    # interacting with objects and picking choices. Returns the shortest
+    # action path to each ending and the number of states visited.
+    world = world or default_world()
+    start = Simulation(world)
+    seen = {start.key()}
+    frontier = deque([(start, ())])
+    paths = {}
+    while frontier:
+        sim, path = frontier.popleft()
+        actions = [('interact', name) for name in world.interactable_names]
+        actions += [('choose', index) for index in range(len(sim.options()))]
+        for action in actions:
+            nxt = sim.copy()
+            nxt.step(action)
+            if nxt.done:
+                paths.setdefault(nxt.ending, path + (action,))
+                continue
+            key = nxt.key()
+            if key not in seen:
+                seen.add(key)
+                frontier.append((nxt, path + (action,)))
+    return paths, len(seen)
+
+
+def check_endings(paths, expected=EXPECTED_ENDINGS, world=None):
+    # Problems with explore()'s paths and the expected playthroughs; empty
+    # when every ending is reachable and each playthrough ends on its last
+    # action with the ending it names
+    problems = [f"{ending}: unreachable" for ending in ENDINGS if ending not in paths]
+    for ending, path in expected.items():
+        sim = Simulation(world)
+        for n, action in enumerate(path):
+            sim.step(action)
+            if sim.done and n + 1 < len(path):
+                break
+        if sim.ending != ending or n + 1 < len(path):
+            problems.append(f"{ending}: expected playthrough ended with {sim.ending} after {n + 1} actions")
+    return problems
+
+
+def _option(name, default):
+    if name in sys.argv:
+        return int(sys.argv[sys.argv.index(name) + 1])
+    return default
+
+
+if __name__ == '__main__':
+    if '--explore' in sys.argv:
+        start = time.perf_counter()
+        paths, states = explore()
+        elapsed = time.perf_counter() - start
+        for ending in sorted(paths):
+            print(f"{ending}: {len(paths[ending])} actions: {paths[ending]}")
+        print(f"{states} quest states explored in {elapsed * 1000:.1f} ms")
+        problems = check_endings(paths)
+        for problem in problems:
+            print(problem)
+        sys.exit(1 if problems else 0)
+    else:
+        runs = _option('--runs', 10000)
+        start = time.perf_counter()
+        endings = run_batch(runs, _option('--workers', None), _option('--steps', RANDOM_STEPS))
+        elapsed = time.perf_counter() - start
+        for ending, count in endings.most_common():
+            print(f"{ending or 'unfinished'}: {count}")
+        print(f"{runs} playthroughs in {elapsed:.2f} s ({runs / elapsed * 60:,.0f} per minute)")
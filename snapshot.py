@@ -0,0 +1,111 @@
+# Game snapshots
+# Everything needed to resume a game, packed into a small binary record.
+# Restoring a snapshot is how the game resets (from one baked at startup),
+# quick-saves and loads, and how playtests jump to mid-quest checkpoints.
+import os
+import struct
+
+MAGIC = b'EOLS'
+VERSION = 1
+
+# magic, version, player x, player y, selected choice, flags
+HEADER = struct.Struct('<4sBiiBB')
+LENGTH = struct.Struct('<H')
+COUNT = struct.Struct('<B')
+
+FLAG_SHOW_CHOICE = 1
+FLAG_SHOW_INVENTORY = 2
+
+SAVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'saves')
+SLOTS = 4
+
+
+class Snapshot:
+    __slots__ = ('state', 'node', 'met', 'inventory', 'player_pos', 'dialog',
+                 'npc_img', 'show_choice', 'choice_context', 'selected_choice',
+                 'show_inventory', 'game_over_message')
+
+    def __init__(self, state, node, met, inventory, player_pos, dialog='',
+                 npc_img=None, show_choice=False, choice_context='',
+                 selected_choice=0, show_inventory=False, game_over_message=''):
+        self.state = state
+        self.node = node
+        self.met = tuple(sorted(met))
+        self.inventory = tuple(inventory)
+        self.player_pos = tuple(player_pos)
+        self.dialog = dialog
+        self.npc_img = npc_img
+        self.show_choice = show_choice
+        self.choice_context = choice_context
+        self.selected_choice = selected_choice
+        self.show_inventory = show_inventory
+        self.game_over_message = game_over_message
+
+    def pack(self):
+        flags = (FLAG_SHOW_CHOICE if self.show_choice else 0) | (FLAG_SHOW_INVENTORY if self.show_inventory else 0)
+        parts = [HEADER.pack(MAGIC, VERSION, self.player_pos[0], self.player_pos[1], self.selected_choice, flags)]
+        for text in (self.state, self.node, self.dialog, self.npc_img or '', self.choice_context, self.game_over_message):
+            parts.append(_pack_str(text))
+        for items in (self.met, self.inventory):
+            parts.append(COUNT.pack(len(items)))
+            parts.extend(_pack_str(item) for item in items)
+        return b''.join(parts)
+
+    @classmethod
+    def unpack(cls, data):
+        # Raises ValueError for anything that isn't a complete, compatible save
+        try:
+            return cls._unpack(data)
+        except struct.error:
+            raise ValueError("truncated save file") from None
+
+    @classmethod
+    def _unpack(cls, data):
+        magic, version, x, y, selected, flags = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a compatible save file")
+        offset = HEADER.size
+        texts = []
+        for _ in range(6):
+            text, offset = _unpack_str(data, offset)
+            texts.append(text)
+        lists = []
+        for _ in range(2):
+            (count,) = COUNT.unpack_from(data, offset)
+            offset += COUNT.size
+            items = []
+            for _ in range(count):
+                item, offset = _unpack_str(data, offset)
+                items.append(item)
+            lists.append(items)
+        state, node, dialog, npc_img, choice_context, message = texts
+        return cls(state, node, lists[0], lists[1], (x, y), dialog, npc_img or None,
+                   bool(flags & FLAG_SHOW_CHOICE), choice_context, selected,
+                   bool(flags & FLAG_SHOW_INVENTORY), message)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(self.pack())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.unpack(f.read())
+
+
+def slot_path(slot):
+    return os.path.join(SAVE_DIR, f'slot{slot}.sav')
+
+
+def _pack_str(text):
+    data = text.encode('utf-8')
+    return LENGTH.pack(len(data)) + data
+
+
+def _unpack_str(data, offset):
+    (length,) = LENGTH.unpack_from(data, offset)
+    offset += LENGTH.size
+    return data[offset:offset + length].decode('utf-8'), offset + length
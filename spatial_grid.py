@@ -0,0 +1,57 @@
+# Uniform-grid spatial index
+# Objects are bucketed by the grid cells their rect overlaps, so viewport and
+# collision queries only look at nearby objects instead of scanning the world.
+# Anything with a rect exposing x, y, w and h can be stored.
+from collections import defaultdict
+
+DEFAULT_CELL_SIZE = 128
+
+
+def rects_overlap(a, b):
+    return a.x < b.x + b.w and b.x < a.x + a.w and a.y < b.y + b.h and b.y < a.y + a.h
+
+
+class SpatialGrid:
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = defaultdict(list)
+        self._order = {}
+        self._cells_of = {}
+        self._next = 0
+
+    def __iter__(self):
+        return iter(sorted(self._order, key=self._order.get))
+
+    def _cell_range(self, rect):
+        size = self.cell_size
+        x0, y0 = rect.x // size, rect.y // size
+        x1 = (rect.x + max(rect.w, 1) - 1) // size
+        y1 = (rect.y + max(rect.h, 1) - 1) // size
+        return [(cx, cy) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1)]
+
+    def insert(self, item):
+        if item in self._order:
+            self.remove(item)
+        self._order[item] = self._next
+        self._next += 1
+        cells = self._cell_range(item.rect)
+        self._cells_of[item] = cells
+        for cell in cells:
+            self.cells[cell].append(item)
+
+    def remove(self, item):
+        for cell in self._cells_of.pop(item, ()):
+            bucket = self.cells[cell]
+            bucket.remove(item)
+            if not bucket:
+                del self.cells[cell]
+        self._order.pop(item, None)
+
+    def query(self, rect):
+        # Items overlapping rect, in insertion order
+        found = set()
+        for cell in self._cell_range(rect):
+            for item in self.cells.get(cell, ()):
+                if item not in found and rects_overlap(item.rect, rect):
+                    found.add(item)
+        return sorted(found, key=self._order.get)
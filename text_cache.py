@@ -0,0 +1,36 @@
+# Text rendering cache
+# Rendered lines and wrapped layouts are memoised with bounded LRU caches, so a
+# string is only rasterised again when its text, colour or wrap width changes.
+import textwrap
+from functools import lru_cache
+
+LINE_CACHE_SIZE = 256
+LAYOUT_CACHE_SIZE = 64
+
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def wrap_text(text, width=70):
+    paras = text.split('\n')
+    lines = []
+    for p in paras:
+        lines.extend(textwrap.wrap(p, width=width))
+    return tuple(lines)
+
+
+@lru_cache(maxsize=LINE_CACHE_SIZE)
+def render_text(font, text, color):
+    return font.render(text, True, color)
+
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def render_wrapped(font, text, color, width, max_lines=None):
+    # Returns the rendered lines of a wrapped block, at most max_lines of them
+    lines = wrap_text(text, width)[:max_lines]
+    return tuple(render_text(font, line, color) for line in lines)
+
+
+def cache_info():
+    return {
+        'lines': render_text.cache_info(),
+        'layouts': render_wrapped.cache_info(),
+    }
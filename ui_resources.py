@@ -0,0 +1,58 @@
+# UI resources
+# Scaled portraits, translucent panels and composites of several UI pieces are
+# built the first time they are drawn and reused on every frame after that,
+# instead of being scaled or allocated anew each frame. invalidate() drops
+# them all; the game calls it when the window is resized, since surfaces are
+# built in the display's pixel format.
+import pygame
+
+from presenter import to_display
+
+
+class UIResources:
+    def __init__(self, load):
+        # load(key) returns the source image for a key
+        self.load = load
+        self._cache = {}
+
+    def get(self, key, build):
+        surface = self._cache.get(key)
+        if surface is None:
+            surface = self._cache[key] = build()
+        return surface
+
+    def invalidate(self):
+        self._cache.clear()
+
+    def scaled(self, key, size):
+        return self.get(('scaled', key, size), lambda: pygame.transform.scale(self.load(key), size))
+
+    def panel(self, size, color):
+        # A solid panel; colors with an alpha component are translucent
+        return self.get(('panel', size, color), lambda: _panel(size, color))
+
+    def composite(self, name, build):
+        # build() returns [(surface, (x, y)), ...] of pieces that don't overlap;
+        # returns one surface holding them all and its top-left position
+        return self.get(('composite', name), lambda: _composite(build()))
+
+
+def _panel(size, color):
+    if len(color) == 4:
+        surface = pygame.Surface(size, pygame.SRCALPHA)
+    else:
+        surface = pygame.Surface(size)
+    surface.fill(color)
+    return to_display(surface, alpha=len(color) == 4)
+
+
+def _composite(pieces):
+    bounds = pygame.Rect(pieces[0][1], pieces[0][0].get_size())
+    bounds.unionall_ip([pygame.Rect(pos, surface.get_size()) for surface, pos in pieces[1:]])
+    surface = pygame.Surface(bounds.size, pygame.SRCALPHA)
+    for piece, (x, y) in pieces:
+        # Additive blits onto the cleared surface copy each piece's pixels,
+        # alpha included, so blitting the composite matches blitting the pieces
+        piece = to_display(piece, alpha=True)
+        surface.blit(piece, (x - bounds.x, y - bounds.y), special_flags=pygame.BLEND_RGBA_ADD)
+    return surface, bounds.topleft
@@ -0,0 +1,134 @@
+# Streamed world layer
+# The background and every prop that never moves are baked offline into
+# fixed-size chunks (see bake_world in bake_assets.py). Chunks near the camera
+# are read on a worker thread before they scroll into view, chunks under the
+# camera are loaded immediately if they are still missing, and chunks that
+# drift far away are dropped, so the game's memory stays proportional to the
+# viewport rather than to the size of the map. The bake itself still decodes
+# the whole background, which is why it runs in its own process.
+import queue
+import threading
+
+import pygame
+
+from bake_assets import CHUNK_FORMAT, chunk_path
+from presenter import to_display
+
+# Chunks beyond the viewport that are loaded ahead of time
+PREFETCH_MARGIN = 1
+# Chunks further than this from the viewport are evicted
+KEEP_MARGIN = 2
+
+
+class ChunkedWorldLayer:
+    def __init__(self, prefetch_margin=PREFETCH_MARGIN, keep_margin=KEEP_MARGIN):
+        self.prefetch_margin = prefetch_margin
+        self.keep_margin = max(keep_margin, prefetch_margin)
+        self.index = None
+        self.chunk_size = 0
+        self.sizes = {}
+        self.chunks = {}
+        self._ready = {}
+        self._requested = set()
+        self._lock = threading.Lock()
+        self._open_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+        self._preparing = None
+
+    @property
+    def dirty(self):
+        return self.index is None
+
+    def prepare(self, build):
+        # build() bakes the world if needed and returns its index
+        with self._open_lock:
+            if self.index is None:
+                self._open(build())
+
+    def prepare_async(self, build):
+        thread = self._preparing = threading.Thread(target=self.prepare, args=(build,), daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        # Waits for a background prepare(); chunk reads need no cleanup
+        if self._preparing is not None:
+            self._preparing.join()
+
+    def _open(self, index):
+        self.chunk_size = index['chunk_size']
+        self.sizes = {(cx, cy): (w, h) for cx, cy, w, h in index['chunks']}
+        self.index = index
+
+    # Loading
+
+    def _read(self, key):
+        with open(chunk_path(*key), 'rb') as f:
+            data = f.read()
+        return pygame.image.frombuffer(data, self.sizes[key], CHUNK_FORMAT)
+
+    def _adopt(self, surface):
+        return to_display(surface)
+
+    def _run(self):
+        while True:
+            key = self._queue.get()
+            surface = self._read(key)
+            with self._lock:
+                if key in self._requested:
+                    self._ready[key] = surface
+
+    def _request(self, key):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+        self._requested.add(key)
+        self._queue.put(key)
+
+    def _chunk_range(self, rect, margin):
+        size = self.chunk_size
+        x0, y0 = rect.left // size - margin, rect.top // size - margin
+        x1, y1 = (rect.right - 1) // size + margin, (rect.bottom - 1) // size + margin
+        return {(cx, cy) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1) if (cx, cy) in self.sizes}
+
+    def update(self, view):
+        # Streams chunks around the world-space view rect; returns True when a
+        # chunk inside the view arrived and the screen needs repainting
+        if self.index is None:
+            return False
+        visible = self._chunk_range(view, 0)
+        wanted = self._chunk_range(view, self.prefetch_margin)
+        keep = self._chunk_range(view, self.keep_margin)
+        arrived = False
+        with self._lock:
+            ready, self._ready = self._ready, {}
+            for key, surface in ready.items():
+                self._requested.discard(key)
+                if key in keep:
+                    self.chunks[key] = self._adopt(surface)
+                    arrived = arrived or key in visible
+            for key in list(self.chunks):
+                if key not in keep:
+                    del self.chunks[key]
+            self._requested &= keep
+            for key in wanted:
+                if key not in self.chunks and key not in self._requested:
+                    self._request(key)
+        return arrived
+
+    def commands(self, offset, visible):
+        # (surface, dest) blits for the chunks covering visible, the
+        # world-space rect that needs painting
+        blits = []
+        size = self.chunk_size
+        for key in sorted(self._chunk_range(visible, 0)):
+            chunk = self.chunks.get(key)
+            if chunk is None:
+                # Under the camera and still missing: load it now
+                chunk = self.chunks[key] = self._adopt(self._read(key))
+                with self._lock:
+                    self._requested.discard(key)
+                    self._ready.pop(key, None)
+            blits.append((chunk, (key[0] * size + offset[0], key[1] * size + offset[1])))
+        return blits